@@ -0,0 +1,271 @@
+"""
+Local stand-ins for the intel services Koioscope queries, for benchmarks and
+end-to-end tests without spending real API quota.
+
+Each service runs its own threaded HTTP server on 127.0.0.1 and answers the
+same paths as the real API with small, deterministic payloads. Whether a hash
+is "known" depends only on the hash, so repeated runs see the same data.
+Latency, error rate and a server-side rate limit (answered with 429 and
+Retry-After) are configurable per service.
+
+    with MockIntel(Behaviour(latency_ms=80, error_rate=0.01)) as mock:
+        cfg = mock.config(cache_dir)      # AppConfig pointed at the mocks
+        ...
+        print(mock.stats())               # requests per service and status
+"""
+from __future__ import annotations
+import hashlib, json, os, random, sys, threading, time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from koioscope.config import AppConfig  # noqa: E402
+
+SERVICES = ("virustotal", "urlhaus", "malwarebazaar", "malshare", "hybrid_analysis",
+            "hashlookup", "otx", "threatfox")
+
+@dataclass
+class Behaviour:
+    latency_ms: float = 50.0  # median response time
+    jitter: float = 0.5  # sigma of the log-normal latency distribution (0 = fixed)
+    error_rate: float = 0.0  # fraction of requests answered with HTTP 500
+    rpm: float = 0.0  # server-side limit; excess requests get 429 (0 = unlimited)
+    burst: int = 10
+    retry_after_s: float = 1.0  # Retry-After sent with a 429 (0 = none)
+    known_ratio: float = 0.5  # fraction of hashes the service has a record for
+
+    def delay(self, rng: random.Random) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.latency_ms / 1000 * (rng.lognormvariate(0, self.jitter) if self.jitter else 1.0)
+
+def _known(h: str, ratio: float, salt: str) -> bool:
+    return int(hashlib.sha256((salt + h).encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < ratio
+
+def _digests(h: str) -> Dict[str, str]:
+    """Stable md5/sha1/sha256 for a synthetic sample, keeping the queried digest as is."""
+    seed = hashlib.sha256(("sample:" + h.lower()).encode()).digest()
+    out = {"md5": hashlib.md5(seed).hexdigest(), "sha1": hashlib.sha1(seed).hexdigest(),
+           "sha256": hashlib.sha256(seed).hexdigest()}
+    kind = {32: "md5", 40: "sha1", 64: "sha256"}.get(len(h))
+    if kind:
+        out[kind] = h.lower()
+    return out
+
+# --- per-service answers: (status, json body or text) -------------------------------------------
+
+Answer = Tuple[int, Any]
+
+def _vt(path: str, query: Dict[str, str], body: bytes, known: Callable[[str], bool]) -> Answer:
+    if path.startswith("/api/v3/intelligence/search"):
+        return 200, {"data": []}
+    if path.startswith("/gui/file/"):
+        return 200, "<html><body>Signature verification Popular names</body></html>"
+    h = path.rsplit("/", 1)[-1]
+    if not known(h):
+        return 404, {"error": {"code": "NotFoundError"}}
+    d = _digests(h)
+    results = {f"Vendor{i}": {"category": "malicious" if i < 3 else "undetected", "engine_version": "1"}
+               for i in range(8)}
+    return 200, {"data": {"id": d["sha256"], "type": "file", "attributes": {
+        **d, "names": [f"sample_{d['md5'][:6]}.exe"], "tags": ["peexe"],
+        "last_analysis_stats": {"malicious": 3, "undetected": 5},
+        "last_analysis_results": results,
+        "first_submission_date": 1600000000, "last_submission_date": 1700000000}}}
+
+def _urlhaus(path, query, body, known) -> Answer:
+    h = parse_qs(body.decode()).get("sha256_hash", [""])[0]
+    if not known(h):
+        return 200, {"query_status": "no_results"}
+    return 200, {"query_status": "ok", "payloads": [{"filename": "dropper.exe", "firstseen": "2023-01-01"}]}
+
+def _malwarebazaar(path, query, body, known) -> Answer:
+    h = parse_qs(body.decode()).get("hash", [""])[0]
+    if not known(h):
+        return 200, {"query_status": "hash_not_found"}
+    d = _digests(h)
+    return 200, {"query_status": "ok", "data": [{
+        "sha256_hash": d["sha256"], "md5_hash": d["md5"], "sha1_hash": d["sha1"],
+        "first_seen": "2023-01-02 00:00:00", "signature": "AgentTesla"}]}
+
+def _malshare(path, query, body, known) -> Answer:
+    h = query.get("hash", "")
+    if not known(h):
+        return 200, {"ERROR": {"CODE": 404, "MESSAGE": "Sample not found"}}
+    d = _digests(h)
+    return 200, {"MD5": d["md5"], "SHA1": d["sha1"], "SHA256": d["sha256"], "F_TYPE": "PE32"}
+
+def _hybrid(path, query, body, known) -> Answer:
+    h = query.get("hash", "")
+    return 200, ([{"verdict": "malicious", "type": "PE32 executable", "submit_name": "x.exe"}]
+                 if known(h) else [])
+
+def _hashlookup(path, query, body, known) -> Answer:
+    if path.startswith("/bulk/"):
+        key = {"md5": "MD5", "sha1": "SHA-1"}[path.rsplit("/", 1)[-1]]
+        hashes = json.loads(body or b"{}").get("hashes", [])
+        return 200, [{key: h.upper(), "FileName": "known.dll"} for h in hashes if known(h)]
+    h = path.rsplit("/", 1)[-1]
+    if not known(h):
+        return 404, {"message": "Non existing"}
+    d = _digests(h)
+    return 200, {"MD5": d["md5"].upper(), "SHA-1": d["sha1"].upper(), "SHA-256": d["sha256"].upper(),
+                 "FileName": "known.dll"}
+
+def _otx(path, query, body, known) -> Answer:
+    h = path.split("/")[-2]
+    pulses = [{"name": "pulse"}] if known(h) else []
+    return 200, {"pulse_info": {"count": len(pulses), "pulses": pulses}}
+
+def _threatfox(path, query, body, known) -> Answer:
+    h = json.loads(body or b"{}").get("hash", "")
+    if not known(h):
+        return 200, {"query_status": "no_result"}
+    return 200, {"query_status": "ok", "data": [{"ioc": h, "malware": "win.agent_tesla"}]}
+
+HANDLERS: Dict[str, Callable[..., Answer]] = {
+    "virustotal": _vt, "urlhaus": _urlhaus, "malwarebazaar": _malwarebazaar, "malshare": _malshare,
+    "hybrid_analysis": _hybrid, "hashlookup": _hashlookup, "otx": _otx, "threatfox": _threatfox,
+}
+
+class _Service:
+    def __init__(self, name: str, behaviour: Behaviour, seed: int):
+        self.name = name
+        self.behaviour = behaviour
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts: Counter = Counter()
+        self._tokens = float(behaviour.burst)
+        self._stamp = time.monotonic()
+
+    def admit(self) -> bool:
+        b = self.behaviour
+        if not b.rpm:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(b.burst, self._tokens + (now - self._stamp) * b.rpm / 60)
+            self._stamp = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def handle(self, method: str, raw_path: str, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        b = self.behaviour
+        with self.lock:
+            delay, fail = b.delay(self.rng), self.rng.random() < b.error_rate
+        if not self.admit():
+            status, headers, payload = 429, {}, {"error": "rate limited"}
+            if b.retry_after_s:
+                headers["Retry-After"] = str(b.retry_after_s)
+        elif fail:
+            time.sleep(delay)
+            status, headers, payload = 500, {}, {"error": "internal"}
+        else:
+            time.sleep(delay)
+            parts = urlsplit(raw_path)
+            query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            known = lambda h: _known(h.lower(), b.known_ratio, self.name)
+            status, payload = HANDLERS[self.name](parts.path, query, body, known)
+            headers = {}
+        with self.lock:
+            self.counts[status] += 1
+        if isinstance(payload, str):
+            headers["Content-Type"] = "text/html"
+            return status, headers, payload.encode()
+        headers["Content-Type"] = "application/json"
+        return status, headers, json.dumps(payload).encode()
+
+def _handler_for(service: _Service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+        def _serve(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            status, headers, data = service.handle(self.command, self.path, body)
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = _serve
+
+        def log_message(self, *args) -> None:
+            pass
+    return Handler
+
+class MockIntel:
+    """All eight services on local ports; ``overrides`` tunes single services."""
+    def __init__(self, behaviour: Optional[Behaviour] = None,
+                 overrides: Optional[Dict[str, Behaviour]] = None, seed: int = 1):
+        base = behaviour or Behaviour()
+        self.services = {name: _Service(name, (overrides or {}).get(name, base), seed + i)
+                         for i, name in enumerate(SERVICES)}
+        self._servers: Dict[str, ThreadingHTTPServer] = {}
+
+    def start(self) -> "MockIntel":
+        for name, svc in self.services.items():
+            srv = ThreadingHTTPServer(("127.0.0.1", 0), _handler_for(svc))
+            srv.daemon_threads = True
+            threading.Thread(target=srv.serve_forever, name=f"mock-{name}", daemon=True).start()
+            self._servers[name] = srv
+        return self
+
+    def stop(self) -> None:
+        for srv in self._servers.values():
+            srv.shutdown()
+            srv.server_close()
+        self._servers.clear()
+
+    def __enter__(self) -> "MockIntel":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def url(self, service: str) -> str:
+        host, port = self._servers[service].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config(self, cache_dir: str, rpm: int = 100000) -> AppConfig:
+        """An AppConfig whose services all point at the mocks, with dummy keys and a fresh cache."""
+        cfg = AppConfig()
+        cfg.cache.dir = cache_dir
+        for name in SERVICES:
+            svc = getattr(cfg, name)
+            svc.base_url = self.url(name)
+            svc.api_key = "mock"
+            svc.rate_limit.requests_per_minute = rpm
+            svc.rate_limit.burst = max(1, rpm // 60)
+        return cfg
+
+    def stats(self) -> Dict[str, Dict[int, int]]:
+        """Requests served per service, by HTTP status."""
+        out = {}
+        for name, svc in self.services.items():
+            with svc.lock:
+                out[name] = dict(svc.counts)
+        return out
+
+    def reset_stats(self) -> None:
+        for svc in self.services.values():
+            with svc.lock:
+                svc.counts.clear()
+
+if __name__ == "__main__":
+    with MockIntel() as m:
+        for name in SERVICES:
+            print(f"{name:16} {m.url(name)}")
+        print("Serving; Ctrl-C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,69 @@
+"""
+Memory per report row: a list of row dicts (what the GUI used to keep) versus
+report.ResultStore, over synthetic rows shaped like merge_results output
+(repeated vendor strings, tag lists, comments and source links).
+
+    python benchmarks/result_store.py [--rows 100000]
+"""
+from __future__ import annotations
+import argparse, gc, os, random, sys, tracemalloc
+from typing import Any, Callable, Dict, Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from koioscope.report import REPORT_COLUMNS, ResultStore  # noqa: E402
+
+VENDORS = ["Microsoft", "Kaspersky", "BitDefender", "ESET-NOD32", "Sophos", "CrowdStrike"]
+FAMILIES = ["Trojan:Win32/Wacatac", "HEUR:Trojan.Win32.Generic", "Gen:Variant.Razy", "AgentTesla", "Emotet"]
+TAGS = ["peexe", "signed", "overlay", "detect-debug-environment", "long-sleeps", "MSSoftware", "Harmless"]
+LINKS = ["https://www.virustotal.com/gui/file/{h}", "https://bazaar.abuse.ch/sample/{h}/",
+         "https://urlhaus.abuse.ch/browse.php?search={h}"]
+
+def synthetic_rows(n: int, seed: int = 3) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    for i in range(n):
+        h = "%064x" % rng.getrandbits(256)
+        known = rng.random() < 0.6
+        vendors = rng.sample(VENDORS, rng.randint(0, 3)) if known else []
+        # Strings are built per row, as merge_results does, so equal values are distinct objects.
+        yield {
+            "hash": h,
+            "comment": f"campaign {rng.randint(1, 20)}",
+            "av_vendor_matches": ";".join(f"{v}:{rng.choice(FAMILIES)}" for v in vendors),
+            "filenames": ";".join(rng.sample(["invoice.exe", "setup.exe", "doc.scr", f"{h[:8]}.bin"],
+                                             rng.randint(0, 2))) if known else "",
+            "pe_description": rng.choice(["", "Setup Launcher", "Windows Host Process"]) if known else "",
+            "pe_original_filename": "", "pe_copyright": "",
+            "signer": rng.choice(["", "", "Microsoft Windows", "yes"]) if known else "",
+            "vt_detection_ratio": f"{rng.randint(0, 30)}/72" if known else "",
+            "first_seen": f"2024-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}" if known else "",
+            "last_seen": f"2025-0{rng.randint(1, 9)}-2{rng.randint(0, 9)}" if known else "",
+            "indicator_tags": ";".join(sorted(rng.sample(TAGS, rng.randint(0, 3)))),
+            "source_links": ";".join(l.format(h=h) for l in LINKS[:rng.randint(1, 3)]),
+            "unavailable_sources": rng.choice(["", "", "", "hybrid_analysis", "vt_html;otx"]),
+        }
+
+def measure(build: Callable[[Iterator[Dict[str, Any]]], Any], n: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    kept = build(synthetic_rows(n))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=100000)
+    args = ap.parse_args()
+
+    dicts = measure(list, args.rows)
+    store = measure(ResultStore.from_rows, args.rows)
+    print(f"{args.rows} rows, {len(REPORT_COLUMNS)} columns")
+    print(f"  list of dicts: {dicts / args.rows:8.0f} bytes/row  ({dicts / 2**20:7.1f} MiB)")
+    print(f"  ResultStore:   {store / args.rows:8.0f} bytes/row  ({store / 2**20:7.1f} MiB)")
+    print(f"  reduction:     {100 * (1 - store / dicts):.0f}%")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
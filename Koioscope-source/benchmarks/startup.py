@@ -0,0 +1,68 @@
+"""
+CLI startup benchmark: imports koioscope.cli in fresh interpreters under
+``-X importtime`` and reports the cumulative import time, the wall-clock
+start-up cost over a bare interpreter, and the slowest modules.
+
+    python benchmarks/startup.py [--runs 15] [--max-ms 150]
+
+Exits non-zero when the median import time exceeds --max-ms.
+"""
+from __future__ import annotations
+import argparse, os, statistics, subprocess, sys, time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET = "koioscope.cli"
+HEAVY = ("pandas", "bs4", "tqdm", "requests", "asyncio", "yaml", "openpyxl")
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (ROOT, env.get("PYTHONPATH")) if p)
+    return env
+
+def _python(code: str, *flags: str) -> Tuple[float, str, str]:
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True,
+                       env=_env(), check=True)
+    return time.perf_counter() - t0, p.stdout, p.stderr
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for each line of -X importtime output."""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        out.append((name.strip(), int(self_us), int(cum_us)))
+    return out
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=15)
+    ap.add_argument("--max-ms", type=float, help="Fail if the median import time is above this")
+    args = ap.parse_args()
+
+    imports, walls, bare = [], [], []
+    rows: List[Tuple[str, int, int]] = []
+    for _ in range(args.runs):
+        bare.append(_python("pass")[0])
+        wall, _, err = _python(f"import {TARGET}", "-X", "importtime")
+        rows = parse_importtime(err)
+        walls.append(wall)
+        imports.append(next(cum for name, _, cum in rows if name == TARGET) / 1000)
+    _, loaded, _ = _python(f"import sys, {TARGET}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))")
+
+    med = statistics.median(imports)
+    print(f"{TARGET} import: median {med:.1f} ms, min {min(imports):.1f} ms ({args.runs} runs)")
+    print(f"start-up over bare interpreter: {1000 * (statistics.median(walls) - statistics.median(bare)):.1f} ms")
+    print(f"heavy modules loaded: {loaded.strip() or 'none'}")
+    print("slowest modules (self time, last run):")
+    for name, self_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:10]:
+        print(f"  {self_us / 1000:7.2f} ms  {name}")
+    if args.max_ms is not None and med > args.max_ms:
+        print(f"FAIL: median {med:.1f} ms > budget {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+End-to-end throughput benchmark against local mock intel services
+(benchmarks/mock_intel.py), so no real API quota is spent.
+
+Drives cli.process_one one hash at a time ("single") and the batch path
+(batch.run_lookup_batch, "batch") over a synthetic hash set, each phase on a
+fresh cache, and reports hashes/sec, p50/p99 lookup latency and the requests
+each mock served, by HTTP status (the client-side koioscope.metrics summary
+goes into the --json output).
+
+    python benchmarks/throughput.py [--hashes 500] [--dup-ratio 0.2] [--latency-ms 50]
+        [--jitter 0.5] [--error-rate 0.01] [--server-rpm 0] [--mode both] [--json out.json]
+"""
+from __future__ import annotations
+import argparse, json, logging, os, random, shutil, statistics, sys, tempfile, threading, time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_intel import Behaviour, MockIntel  # noqa: E402
+from koioscope import http_pool, metrics, ratelimit, resilience  # noqa: E402
+from koioscope.config import AppConfig  # noqa: E402
+
+def synthetic_hashes(n: int, dup_ratio: float = 0.2, seed: int = 7) -> List[str]:
+    """``n`` md5/sha1/sha256 hashes (mixed, like real alert exports), ``dup_ratio`` of them repeats."""
+    rng = random.Random(seed)
+    unique = max(1, round(n * (1 - dup_ratio)))
+    pool = ["%0*x" % (width, rng.getrandbits(width * 4))
+            for width in (rng.choice((32, 40, 64)) for _ in range(unique))]
+    out = pool + [rng.choice(pool) for _ in range(n - unique)]
+    rng.shuffle(out)
+    return out
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _fresh(mock: MockIntel, cache_dir: str, args) -> AppConfig:
+    """A config on an empty cache, with limiters, breakers and latency history reset."""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    ratelimit.reset_limiters()
+    resilience.reset()
+    http_pool._trackers.clear()
+    metrics.reset()
+    mock.reset_stats()
+    cfg = mock.config(cache_dir, rpm=args.client_rpm)
+    cfg.concurrency.max_in_flight = args.concurrency
+    cfg.timeouts.deadline_s = args.deadline_s
+    return cfg
+
+def run_single(mock: MockIntel, cache_dir: str, hashes: List[str], args, logger) -> Dict[str, Any]:
+    from koioscope.cli import process_one
+    from koioscope.vt_client import VirusTotalClient
+    cfg = _fresh(mock, cache_dir, args)
+    vt = VirusTotalClient(cfg, logger)
+    latencies = []
+    t0 = time.perf_counter()
+    for h in hashes:
+        t = time.perf_counter()
+        process_one(cfg, logger, vt, h, "")
+        latencies.append(time.perf_counter() - t)
+    return _summary("single", len(hashes), time.perf_counter() - t0, latencies, 0, mock)
+
+def run_batch(mock: MockIntel, cache_dir: str, hashes: List[str], args, logger) -> Dict[str, Any]:
+    from koioscope.batch import run_lookup_batch
+    from koioscope.cli import process_one
+    from koioscope.vt_client import VirusTotalClient
+    cfg = _fresh(mock, cache_dir, args)
+    vt = VirusTotalClient(cfg, logger)
+    latencies: List[float] = []
+    lock = threading.Lock()
+    failed = 0
+
+    def process(q: str, c: str) -> Dict[str, Any]:
+        t = time.perf_counter()
+        try:
+            return process_one(cfg, logger, vt, q, c)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    def on_outcome(out) -> None:
+        nonlocal failed
+        failed += out.error is not None
+
+    t0 = time.perf_counter()
+    n = run_lookup_batch(cfg, logger, [(h, "") for h in hashes], process, on_outcome, [])
+    return _summary("batch", n, time.perf_counter() - t0, latencies, failed, mock)
+
+def _summary(mode: str, rows: int, elapsed: float, latencies: List[float], failed: int,
+             mock: MockIntel) -> Dict[str, Any]:
+    return {
+        "mode": mode,
+        "rows": rows,
+        "lookups": len(latencies),
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "hashes_per_s": round(rows / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(1000 * _pct(latencies, 0.50), 1),
+        "p99_ms": round(1000 * _pct(latencies, 0.99), 1),
+        "mean_ms": round(1000 * statistics.fmean(latencies), 1) if latencies else 0.0,
+        "requests": {svc: {str(k): v for k, v in sorted(c.items())} for svc, c in mock.stats().items()},
+        "client_metrics": metrics.REGISTRY.summary(),
+    }
+
+def _print(r: Dict[str, Any]) -> None:
+    print(f"[{r['mode']}] {r['rows']} rows ({r['lookups']} lookups, {r['failed']} failed) in {r['seconds']:.2f}s: "
+          f"{r['hashes_per_s']:.1f} hashes/s, p50 {r['p50_ms']:.0f} ms, p99 {r['p99_ms']:.0f} ms")
+    for svc, counts in r["requests"].items():
+        total = sum(counts.values())
+        detail = ", ".join(f"{k}: {v}" for k, v in counts.items())
+        print(f"  {svc:16} {total:6d} requests  ({detail})")
+    for line in metrics.describe(r["client_metrics"]):
+        if line.startswith("cache:"):
+            print(f"  {line}")
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--hashes", type=int, default=500)
+    ap.add_argument("--dup-ratio", type=float, default=0.2, help="Fraction of rows repeating an earlier hash")
+    ap.add_argument("--mode", choices=("single", "batch", "both"), default="both")
+    ap.add_argument("--single-hashes", type=int, default=50, help="Hashes for the (slow) single-lookup phase")
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="Median mock response time")
+    ap.add_argument("--jitter", type=float, default=0.5, help="Log-normal sigma of mock latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock responses that are HTTP 500")
+    ap.add_argument("--server-rpm", type=float, default=0.0, help="Mock rate limit answered with 429 (0 = none)")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on mock 429s")
+    ap.add_argument("--known-ratio", type=float, default=0.5, help="Fraction of hashes each mock has a record for")
+    ap.add_argument("--client-rpm", type=int, default=100000, help="Client-side rate limit per service")
+    ap.add_argument("--concurrency", type=int, default=16, help="Hashes in flight in batch mode")
+    ap.add_argument("--deadline-s", type=float, default=0.0, help="Per-lookup deadline in batch mode")
+    ap.add_argument("--json", help="Also write the results here as JSON")
+    args = ap.parse_args()
+
+    logger = logging.getLogger("koioscope.bench")
+    logger.addHandler(logging.StreamHandler(sys.stderr))
+    logger.setLevel(logging.ERROR)
+    behaviour = Behaviour(latency_ms=args.latency_ms, jitter=args.jitter, error_rate=args.error_rate,
+                          rpm=args.server_rpm, retry_after_s=args.retry_after, known_ratio=args.known_ratio)
+    hashes = synthetic_hashes(args.hashes, args.dup_ratio)
+    results = []
+    tmp = tempfile.mkdtemp(prefix="koioscope-bench-")
+    try:
+        with MockIntel(behaviour) as mock:
+            if args.mode in ("single", "both"):
+                results.append(run_single(mock, os.path.join(tmp, "single"), hashes[:args.single_hashes],
+                                          args, logger))
+                _print(results[-1])
+            if args.mode in ("batch", "both"):
+                results.append(run_batch(mock, os.path.join(tmp, "batch"), hashes, args, logger))
+                _print(results[-1])
+    finally:
+        http_pool.close_sessions()
+        shutil.rmtree(tmp, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import threading
+from itertools import islice
+from typing import Callable, Container, Dict, Iterable, Iterator, List, Tuple, Union
+from .config import AppConfig
+from .engine import Outcome, ProcessFn, run_batch
+from .cache import resolve_aliases
+from .lookup import merge_sources, prefetch_bulk, probe_cache
+from .merge import policy_for
+from .utils import detect_hash_type, normalize_hash
+
+# Input rows are partitioned this many at a time, so lookups start before the file is read.
+CHUNK_ROWS = 2000
+
+# Rows of one unique query: (input index, original query, comment).
+Group = List[Tuple[int, str, str]]
+
+def partition(items: Iterable[Tuple[str, str]], start: int = 0,
+              skip: Container[int] = ()) -> Dict[str, Group]:
+    """Group input rows by normalized query, keeping first-seen order; rows in ``skip`` are left out."""
+    groups: Dict[str, Group] = {}
+    for i, (q, c) in enumerate(items, start):
+        if i in skip:
+            continue
+        key = normalize_hash(q) if detect_hash_type(q) else q.strip()
+        groups.setdefault(key, []).append((i, q, c))
+    return groups
+
+def run_lookup_batch(cfg: AppConfig, logger, items: Iterable[Tuple[str, str]], process: ProcessFn,
+                     on_outcome: Callable[[Outcome], None], vendor_allowlist: List[str],
+                     chunk_rows: int = CHUNK_ROWS, skip: Container[int] = ()) -> int:
+    """
+    Stream the batch through in chunks. For each chunk: deduplicate, answer what
+    the cache can in one bulk probe, warm the cache through sources with bulk
+    endpoints, then queue only the unique misses on the engine. Every input row
+    gets its own Outcome (with its own comment), except the row indices in
+    ``skip`` (done in an earlier run); returns the number of outcomes.
+    """
+    it = iter(items)
+    chunks = iter(lambda: list(islice(it, chunk_rows)), [])
+    return run_lookup_chunks(cfg, logger, chunks, process, on_outcome, vendor_allowlist, skip)
+
+def run_lookup_chunks(cfg: AppConfig, logger, chunks: Iterable[List[Tuple[str, str]]], process: ProcessFn,
+                      on_outcome: Callable[[Outcome], None], vendor_allowlist: List[str],
+                      skip: Container[int] = ()) -> int:
+    """
+    run_lookup_batch over rows already cut into chunks; the next chunk is only
+    taken once every lookup of the last one has a slot on the engine. Row
+    indices run on across chunks.
+    """
+    pending: Dict[str, Group] = {}  # queued or in-flight keys -> rows waiting on them
+    miss_keys: Dict[int, str] = {}  # engine index -> key
+    stats = {"rows": 0, "cached": 0, "looked_up": 0}
+    policy = policy_for(cfg, vendor_allowlist)
+    n = 0
+
+    def emit(out: Outcome) -> None:
+        nonlocal n
+        on_outcome(out)
+        n += 1
+
+    # misses() runs on the engine's input thread, fan_out on its loop thread.
+    lock = threading.Lock()
+
+    def misses() -> Iterator[Union[Tuple[str, str], Outcome]]:
+        seq = 0
+        for chunk in chunks:
+            groups = partition(chunk, stats["rows"], skip)
+            stats["rows"] += len(chunk)
+            with lock:
+                for key in [k for k in groups if k in pending]:
+                    pending[key].extend(groups.pop(key))  # same hash already on its way
+            hashes = [k for k in groups if detect_hash_type(k)]
+            canon = resolve_aliases(cfg, hashes)
+            hits = probe_cache(cfg, list({canon.get(k, k) for k in hashes}))
+            for key in hashes:
+                raw = hits.get(canon.get(key, key))
+                if raw is None:
+                    continue
+                for i, q, c in groups.pop(key):
+                    stats["cached"] += 1
+                    yield Outcome(i, q, c, merge_sources(key, c, policy, raw), answered=True)
+            prefetch_bulk(cfg, logger, [canon.get(k, k) for k in groups if detect_hash_type(k)])
+            for key, group in groups.items():
+                with lock:
+                    pending[key] = group
+                miss_keys[seq] = key
+                seq += 1
+                stats["looked_up"] += 1
+                yield key, group[0][2]
+
+    def fan_out(out: Outcome) -> None:
+        if out.answered:
+            emit(out)
+            return
+        with lock:
+            group = pending.pop(miss_keys.pop(out.index))
+        for i, q, c in group:
+            result = dict(out.result, comment=c) if out.result is not None else None
+            emit(Outcome(i, q, c, result, out.error))
+
+    run_batch(misses(), process, fan_out, cfg.concurrency.max_in_flight, logger)
+    logger.info("Batch: %d rows, %d answered from cache, %d unique lookups",
+                stats["rows"], stats["cached"], stats["looked_up"])
+    return n
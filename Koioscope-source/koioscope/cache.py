@@ -1,30 +1,215 @@
 from __future__ import annotations
-import json, os, time
-from typing import Any, Dict, Optional
+import glob, json, os, sqlite3, threading, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from .config import AppConfig
 
-def _path_for(cache_dir: str, h: str) -> str:
-    safe = h.lower()
-    return os.path.join(cache_dir, f"{safe}.json")
+DB_NAME = "cache.sqlite3"
+_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+_SCHEMA = """
+-- Merged rows (migrate_json_cache, save_to_cache/save_many); lookups only read them, see load_from_cache.
+CREATE TABLE IF NOT EXISTS results (
+    hash TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_fetched_at ON results(fetched_at);
+CREATE TABLE IF NOT EXISTS raw (
+    hash TEXT NOT NULL,
+    source TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (hash, source)
+);
+CREATE INDEX IF NOT EXISTS raw_fetched_at ON raw(fetched_at);
+CREATE TABLE IF NOT EXISTS aliases (
+    digest TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+"""
+
+_local = threading.local()
+
+def cache_path(cfg: AppConfig) -> str:
+    return os.path.join(cfg.cache.dir, DB_NAME)
+
+def _conn(cfg: AppConfig) -> sqlite3.Connection:
+    """One connection per thread and cache file; WAL lets readers and a writer run together."""
+    conns: Optional[Dict[str, sqlite3.Connection]] = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    path = cache_path(cfg)
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(cfg.cache.dir, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conns[path] = conn
+    return conn
+
+def _min_fetched_at(cfg: AppConfig) -> float:
+    return time.time() - cfg.cache.ttl_minutes * 60
 
 def load_from_cache(cfg: AppConfig, h: str) -> Optional[Dict[str, Any]]:
-    os.makedirs(cfg.cache.dir, exist_ok=True)
-    p = _path_for(cfg.cache.dir, h)
-    if not os.path.exists(p):
-        return None
+    """
+    A stored merged row (e.g. imported by migrate_json_cache), if still fresh.
+    Lookups only store raw responses; this table is read when a hash has none of them.
+    """
     try:
-        with open(p, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        ts = data.get("fetched_at", 0)
-        if time.time() - ts <= cfg.cache.ttl_minutes * 60:
-            return data.get("result")
-        return None
+        row = _conn(cfg).execute(
+            "SELECT result FROM results WHERE hash = ? AND fetched_at >= ?",
+            (h.lower(), _min_fetched_at(cfg))).fetchone()
+        return json.loads(row[0]) if row else None
     except Exception:
         return None
 
+def load_many(cfg: AppConfig, hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Fresh merged rows for any of ``hashes``, keyed by lower-case hash."""
+    keys = list(dict.fromkeys(h.lower() for h in hashes))
+    out: Dict[str, Dict[str, Any]] = {}
+    conn = _conn(cfg)
+    cutoff = _min_fetched_at(cfg)
+    for i in range(0, len(keys), _CHUNK):
+        chunk = keys[i:i + _CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for h, result in conn.execute(
+                f"SELECT hash, result FROM results WHERE hash IN ({marks}) AND fetched_at >= ?",
+                (*chunk, cutoff)):
+            out[h] = json.loads(result)
+    return out
+
 def save_to_cache(cfg: AppConfig, h: str, result: Dict[str, Any]) -> None:
-    os.makedirs(cfg.cache.dir, exist_ok=True)
-    p = _path_for(cfg.cache.dir, h)
-    payload = {"fetched_at": time.time(), "result": result}
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    """Store a merged row in ``results`` (lookups themselves only write raw responses)."""
+    save_many(cfg, [(h, result)])
+
+def save_many(cfg: AppConfig, items: Iterable[Tuple[str, Dict[str, Any]]], fetched_at: Optional[float] = None) -> int:
+    """Upsert merged rows in a single transaction; returns the number written."""
+    now = fetched_at if fetched_at is not None else time.time()
+    rows = [(h.lower(), now, json.dumps(r, ensure_ascii=False)) for h, r in items]
+    conn = _conn(cfg)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("INSERT OR REPLACE INTO results(hash, fetched_at, result) VALUES (?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+def service_of(source: str) -> str:
+    """Config service behind a raw-response key (vt_api/vt_html belong to virustotal)."""
+    return "virustotal" if source.startswith("vt_") else source
+
+def raw_ttl_seconds(cfg: AppConfig, source: str) -> float:
+    return cfg.cache.service_ttl_minutes.get(service_of(source), cfg.cache.ttl_minutes) * 60
+
+def load_raw(cfg: AppConfig, h: str) -> Dict[str, Dict[str, Any]]:
+    """Raw source responses for ``h`` that are still within their service's TTL."""
+    try:
+        return load_raw_many(cfg, [h]).get(h.lower(), {})
+    except Exception:
+        return {}
+
+def load_raw_many(cfg: AppConfig, hashes: Iterable[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Bulk form of load_raw: {hash: {source: payload}} for hashes with any fresh response."""
+    keys = list(dict.fromkeys(h.lower() for h in hashes))
+    now = time.time()
+    out: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    conn = _conn(cfg)
+    for i in range(0, len(keys), _CHUNK):
+        chunk = keys[i:i + _CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for h, source, fetched_at, payload in conn.execute(
+                f"SELECT hash, source, fetched_at, payload FROM raw WHERE hash IN ({marks})", chunk):
+            if now - fetched_at <= raw_ttl_seconds(cfg, source):
+                out.setdefault(h, {})[source] = json.loads(payload)
+    return out
+
+def save_raw(cfg: AppConfig, h: str, payloads: Dict[str, Dict[str, Any]]) -> None:
+    _save_raw_rows(cfg, [(h, src, p) for src, p in payloads.items()])
+
+def save_raw_many(cfg: AppConfig, source: str, payloads: Dict[str, Dict[str, Any]]) -> None:
+    """Store one source's answers for many hashes (bulk endpoints) in one transaction."""
+    _save_raw_rows(cfg, [(h, source, p) for h, p in payloads.items()])
+
+def _save_raw_rows(cfg: AppConfig, items: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+    if not items:
+        return
+    now = time.time()
+    rows = [(h.lower(), src, now, json.dumps(p, ensure_ascii=False)) for h, src, p in items]
+    conn = _conn(cfg)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("INSERT OR REPLACE INTO raw(hash, source, fetched_at, payload) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+def save_aliases(cfg: AppConfig, digests: Iterable[str], sha256: str) -> None:
+    """Record that every digest in ``digests`` names the sample ``sha256``."""
+    rows = [(d.lower(), sha256.lower()) for d in digests if d]
+    _conn(cfg).executemany("INSERT OR REPLACE INTO aliases(digest, sha256) VALUES (?, ?)", rows)
+
+def resolve_aliases(cfg: AppConfig, hashes: Iterable[str]) -> Dict[str, str]:
+    """Canonical sha256 for each known md5/sha1/sha256 in ``hashes``, keyed by lower-case input."""
+    keys = list(dict.fromkeys(h.lower() for h in hashes))
+    out: Dict[str, str] = {}
+    conn = _conn(cfg)
+    for i in range(0, len(keys), _CHUNK):
+        chunk = keys[i:i + _CHUNK]
+        marks = ",".join("?" * len(chunk))
+        out.update(conn.execute(f"SELECT digest, sha256 FROM aliases WHERE digest IN ({marks})", chunk).fetchall())
+    return out
+
+def resolve_alias(cfg: AppConfig, h: str) -> Optional[str]:
+    try:
+        return resolve_aliases(cfg, [h]).get(h.lower())
+    except Exception:
+        return None
+
+def purge_expired(cfg: AppConfig) -> int:
+    """Delete entries past their TTL (run by ``purge-cache``); returns how many went."""
+    conn = _conn(cfg)
+    n = conn.execute("DELETE FROM results WHERE fetched_at < ?", (_min_fetched_at(cfg),)).rowcount
+    # Raw rows: drop anything older than the longest TTL in use; load_raw filters the rest.
+    longest = max([cfg.cache.ttl_minutes, *cfg.cache.service_ttl_minutes.values()]) * 60
+    n += conn.execute("DELETE FROM raw WHERE fetched_at < ?", (time.time() - longest,)).rowcount
+    return n
+
+def migrate_json_cache(cfg: AppConfig, json_dir: Optional[str] = None, remove: bool = False) -> int:
+    """
+    Import legacy one-file-per-hash ``<hash>.json`` entries into the SQLite cache.
+    They hold merged rows only, so they go into ``results`` and are served by
+    lookup_hash (see load_from_cache) until they expire. Newer entries already
+    in the database win; unreadable files are skipped.
+    """
+    src = json_dir or cfg.cache.dir
+    rows: List[Tuple[str, float, str]] = []
+    imported: List[str] = []
+    for p in glob.glob(os.path.join(src, "*.json")):
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            h = os.path.splitext(os.path.basename(p))[0].lower()
+            rows.append((h, float(data.get("fetched_at", 0)), json.dumps(data["result"], ensure_ascii=False)))
+            imported.append(p)
+        except Exception:
+            continue
+    conn = _conn(cfg)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO results(hash, fetched_at, result) VALUES (?, ?, ?) "
+            "ON CONFLICT(hash) DO UPDATE SET fetched_at = excluded.fetched_at, result = excluded.result "
+            "WHERE excluded.fetched_at > results.fetched_at", rows)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if remove:
+        for p in imported:
+            os.remove(p)
+    return len(rows)
@@ -1,16 +1,22 @@
 from __future__ import annotations
-import argparse, os, pandas as pd
-from typing import List, Tuple, Dict, Any
+import argparse, os
+from typing import TYPE_CHECKING, List, Dict, Any
 from koioscope import __app_name__, __version__
 from koioscope.config import load_config, AppConfig
 from koioscope.logging_setup import setup_logging
 from koioscope.utils import detect_hash_type, normalize_hash
-from koioscope.cache import load_from_cache, save_to_cache
+from koioscope.cache import migrate_json_cache, purge_expired, cache_path
 from koioscope.vt_client import VirusTotalClient
-from koioscope.sources import urlhaus, malwarebazaar, otx, threatfox, malshare, hybrid_analysis, hashlookup
-from koioscope.merge import merge_results
-from koioscope.report import write_report
-from tqdm import tqdm
+from koioscope.lookup import lookup_hash, merge_sources, empty_sources
+from koioscope.merge import policy_for
+from koioscope.report import write_report, is_streaming, ReportWriter, OrderedRows
+from koioscope import journal, metrics, profiling
+
+if TYPE_CHECKING:
+    from koioscope.engine import Outcome
+
+# Batch-only modules (asyncio engine, tqdm, the work queue) are imported where
+# they are used: the CLI is often started once per alert for a single --query.
 
 def _load_vendor_list(path: str | None) -> List[str]:
     if not path:
@@ -18,20 +24,8 @@ def _load_vendor_list(path: str | None) -> List[str]:
     with open(path, "r", encoding="utf-8") as f:
         return [line.strip() for line in f if line.strip()]
 
-def _read_batch(path: str) -> List[Tuple[str, str]]:
-    if path.lower().endswith(".xlsx"):
-        df = pd.read_excel(path)
-    else:
-        df = pd.read_csv(path)
-    rows: List[Tuple[str, str]] = []
-    for _, r in df.iterrows():
-        h = str(r.get("hash","")).strip()
-        c = str(r.get("comment","")).strip() if "comment" in df.columns else ""
-        if h:
-            rows.append((h, c))
-    return rows
-
-def process_one(cfg: AppConfig, logger, vt: VirusTotalClient, query: str, comment: str) -> Dict[str, Any]:
+def process_one(cfg: AppConfig, logger, vt: VirusTotalClient, query: str, comment: str,
+                deadline_s: float | None = None) -> Dict[str, Any]:
     if (ht := detect_hash_type(query)):
         h = normalize_hash(query)
     else:
@@ -42,59 +36,173 @@ def process_one(cfg: AppConfig, logger, vt: VirusTotalClient, query: str, commen
         else:
             h = normalize_hash(query)
 
-    cached = load_from_cache(cfg, h)
-    if cached:
-        logger.info("Cache hit for %s", h)
-        return cached
-
-    vt_api = vt.fetch_file_report(h) if ht else {}
-    vt_html = vt.scrape_permalink_fields(h) if ht else {}
-
-    md5_hint = None
-    try:
-    	md5_hint = (((vt_api or {}).get("data") or {}).get("attributes") or {}).get("md5")
-    except Exception:
-    	md5_hint = None
-
-    uh = urlhaus.query_hash(cfg, logger, h) if ht else {}
-    mb = malwarebazaar.query_hash(cfg, logger, h) if ht else {}
-    ms = malshare.query_hash(cfg, logger, md5_hint or h) if ht else {}
-    ha = hybrid_analysis.query_hash(cfg, logger, h) if ht else {}
-    hl = hashlookup.query_hash(cfg, logger, h) if ht else {}
-    ox = otx.query_hash(cfg, logger, h) if ht else {}
-    tf = threatfox.query_hash(cfg, logger, h) if ht else {}
-
-    result = merge_results(h, comment, cfg.vendor_allowlist, vt_api, vt_html, uh, mb, ms, ha, hl, ox, tf)
-    save_to_cache(cfg, h, result)
-    return result
+    if not detect_hash_type(h):
+        return merge_sources(h, comment, policy_for(cfg), empty_sources())
+    return lookup_hash(cfg, logger, vt, h, comment, cfg.vendor_allowlist, deadline_s)
 
 def main():
     ap = argparse.ArgumentParser(f"{__app_name__} CLI")
-    ap.add_argument("--config", required=True, help="Path to config.yaml or .json")
+    ap.add_argument("--config", help="Path to config.yaml or .json (required except for enqueue/collect)")
     ap.add_argument("--query", help="Single hash or filename")
-    ap.add_argument("--batch", help="CSV or XLSX with columns: hash[,comment]")
-    ap.add_argument("--out", default="out/report.csv", help="Output CSV or XLSX")
+    ap.add_argument("--batch", help="CSV/XLSX with columns hash[,comment], or .txt with one hash per line (.gz ok)")
+    ap.add_argument("--out", default="out/report.csv", help="Output CSV, JSONL or XLSX")
     ap.add_argument("--vendor-list", help="Plaintext list of AV vendors to include (overrides config)")
+    ap.add_argument("--concurrency", type=int, help="Hashes looked up at once in batch mode (overrides config)")
+    ap.add_argument("--resume", action="store_true",
+                    help="Continue an interrupted --batch run: skip completed rows, retry failed ones")
+    ap.add_argument("--run-id", help="Name of the batch run in the journal (default: input file name + content hash)")
+    ap.add_argument("--profile", action="store_true",
+                    help="Time each pipeline stage (ingest, cache, throttle, network, parsing, merge, report) and log a breakdown")
+    ap.add_argument("--profile-out", metavar="FILE",
+                    help="Also profile the whole run: FILE.prof gets a cProfile dump, any other name sampled stacks "
+                         "in folded (flamegraph) format; implies --profile")
+    sub = ap.add_subparsers(dest="command", metavar="{enqueue,worker,collect,migrate-cache,purge-cache}",
+                            help="Distributed mode over a shared SQLite work queue, and cache maintenance")
+    p_enq = sub.add_parser("enqueue", help="Load a batch file into the work queue")
+    p_enq.add_argument("--queue", required=True, help="Path to the SQLite queue file")
+    p_enq.add_argument("--batch", required=True, help="CSV/XLSX with columns hash[,comment], or .txt with one hash per line (.gz ok)")
+    p_wrk = sub.add_parser("worker", help="Claim and process queued hashes (uses this --config's keys)")
+    p_wrk.add_argument("--queue", required=True, help="Path to the SQLite queue file")
+    p_wrk.add_argument("--worker-id", help="Name recorded on claimed jobs (default host:pid)")
+    p_wrk.add_argument("--lease", type=float, default=900.0,
+                       help="Lease length in seconds; renewed while the worker runs, so it only runs out if the worker dies")
+    p_wrk.add_argument("--max-attempts", type=int, default=3, help="Attempts before a job is marked failed")
+    p_col = sub.add_parser("collect", help="Write the report for a work queue")
+    p_col.add_argument("--queue", required=True, help="Path to the SQLite queue file")
+    p_col.add_argument("--out", default="out/report.csv", help="Output CSV, JSONL or XLSX")
+    p_mig = sub.add_parser("migrate-cache", help="Import a legacy per-hash JSON cache into the SQLite cache")
+    p_mig.add_argument("--json-dir", help="Directory of <hash>.json files (default: cache.dir)")
+    p_mig.add_argument("--remove", action="store_true", help="Delete JSON files once imported")
+    sub.add_parser("purge-cache", help="Delete cache entries past their TTL")
     args = ap.parse_args()
 
-    cfg = load_config(args.config)
     logger = setup_logging()
+    if args.command in ("enqueue", "collect", "worker"):
+        from koioscope import workqueue
+    if args.command == "enqueue":
+        from koioscope.ingest import iter_batch
+        n = workqueue.enqueue(workqueue.connect(args.queue), iter_batch(args.batch, logger))
+        logger.info("Queued %d rows in %s", n, args.queue)
+        return
+    if args.command == "collect":
+        conn = workqueue.connect(args.queue)
+        left = {k: v for k, v in workqueue.counts(conn).items() if k != "done"}
+        if left:
+            logger.warning("Queue not finished: %s", left)
+        write_report(workqueue.iter_results(conn), args.out)
+        logger.info("Wrote %s", args.out)
+        return
+    if not args.config:
+        ap.error("--config is required")
+
+    cfg = load_config(args.config)
+    if args.command == "migrate-cache":
+        n = migrate_json_cache(cfg, args.json_dir, args.remove)
+        logger.info("Imported %d cached results into %s", n, cache_path(cfg))
+        return
+    if args.command == "purge-cache":
+        n = purge_expired(cfg)
+        logger.info("Purged %d expired entries from %s", n, cache_path(cfg))
+        return
     if args.vendor_list:
         cfg.vendor_allowlist = _load_vendor_list(args.vendor_list)
+    if args.concurrency:
+        cfg.concurrency.max_in_flight = args.concurrency
 
     vt = VirusTotalClient(cfg, logger)
+    if args.profile or args.profile_out:
+        profiling.enable()
+    profiler = profiling.RunProfiler(args.profile_out).start() if args.profile_out else None
+    try:
+        _run(args, ap, cfg, logger, vt)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            logger.info("Wrote profile %s", args.profile_out)
+
+def _run(args: argparse.Namespace, ap: argparse.ArgumentParser, cfg: AppConfig, logger, vt: VirusTotalClient) -> None:
+    if args.command == "worker":
+        from koioscope import workqueue
+        n = workqueue.run_worker(workqueue.connect(args.queue), cfg, lambda q, c: process_one(cfg, logger, vt, q, c),
+                                 logger, args.worker_id, args.lease, args.max_attempts)
+        logger.info("Worker finished: %d jobs", n)
+        metrics.emit(cfg, logger, run="worker", queue=args.queue, jobs=n, **_profile_report(logger, n))
+        return
 
     rows: List[Dict[str, Any]] = []
     if args.query:
-        rows.append(process_one(cfg, logger, vt, args.query, ""))
+        rows.append(process_one(cfg, logger, vt, args.query, "", cfg.timeouts.interactive_deadline_s))
     elif args.batch:
-        for h, c in tqdm(_read_batch(args.batch), desc="Processing"):
-            rows.append(process_one(cfg, logger, vt, h, c))
+        _run_batch_file(cfg, logger, vt, args.batch, args.out, args.run_id, args.resume)
+        return
     else:
         ap.error("either --query or --batch is required")
 
-    write_report(rows, args.out)
+    with profiling.stage("report"):
+        write_report(rows, args.out)
     logger.info("Wrote %s", args.out)
+    metrics.emit(cfg, run="query", query=args.query, **_profile_report(logger, len(rows)))
+
+def _profile_report(logger, rows: int) -> Dict[str, Any]:
+    """Log the --profile stage breakdown and return it for the metrics summary (nothing when off)."""
+    if not profiling.enabled():
+        return {}
+    summary = profiling.summary(rows)
+    for line in profiling.describe(summary):
+        logger.info("%s", line)
+    return {"profile": summary}
+
+def _run_batch_file(cfg: AppConfig, logger, vt: VirusTotalClient, batch: str, out_path: str,
+                    run_id: str | None = None, resume: bool = False) -> None:
+    """
+    Look up a batch file, checkpointing every row in the run journal. A fresh
+    CSV/JSONL run writes rows as they complete; XLSX and resumed runs write the
+    report from the journal at the end.
+    """
+    from tqdm import tqdm
+    from koioscope.batch import run_lookup_batch
+    from koioscope.ingest import iter_batch
+    conn = journal.connect(journal.journal_path(cfg))
+    fp = journal.fingerprint(batch)
+    run_id = run_id or journal.default_run_id(batch, fp)
+    done = journal.start_run(conn, run_id, batch, fp, out_path, resume)
+    if resume:
+        logger.info("Resuming run %s: %d rows already done", run_id, len(done))
+    items = iter_batch(batch, logger)
+    if profiling.enabled():
+        items = profiling.timed_iter("ingest", items)
+    process = lambda q, c: process_one(cfg, logger, vt, q, c)
+    stream = is_streaming(out_path) and not done
+    with tqdm(desc="Processing", unit="row", initial=len(done)) as bar:
+        if stream:
+            with ReportWriter(out_path) as w:
+                ordered = OrderedRows(w)
+                def on_outcome(out: Outcome) -> None:
+                    with profiling.stage("journal"):
+                        journal.record(conn, run_id, out)
+                    with profiling.stage("report"):
+                        ordered.add(out.index, out.result or {"hash": out.query, "comment": out.comment})
+                    bar.update(1)
+                try:
+                    run_lookup_batch(cfg, logger, items, process, on_outcome, cfg.vendor_allowlist)
+                finally:
+                    ordered.flush()  # keep what finished even if the run is interrupted
+        else:
+            def on_outcome(out: Outcome) -> None:
+                with profiling.stage("journal"):
+                    journal.record(conn, run_id, out)
+                bar.update(1)
+            run_lookup_batch(cfg, logger, items, process, on_outcome, cfg.vendor_allowlist, skip=done)
+            with profiling.stage("report"):
+                write_report(journal.iter_rows(conn, run_id), out_path)
+    journal.finish_run(conn, run_id)
+    counts = journal.counts(conn, run_id)
+    failed = counts.get("failed", 0)
+    if failed:
+        logger.warning("%d rows failed in run %s; rerun with --resume to retry them", failed, run_id)
+    logger.info("Wrote %s", out_path)
+    metrics.emit(cfg, logger, run=run_id, input=batch, rows=counts,
+                 **_profile_report(logger, sum(counts.values())))
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,5 @@
 from __future__ import annotations
 import json
-import yaml
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
@@ -8,20 +7,73 @@ from typing import Any, Dict, List, Optional
 class CacheConfig:
     dir: str = "cache"
     ttl_minutes: int = 1440  # 24h
+    # Raw-response TTL per service, e.g. {"hashlookup": 43200}; unset ones use ttl_minutes.
+    service_ttl_minutes: Dict[str, int] = field(default_factory=dict)
+
+@dataclass
+class ConcurrencyConfig:
+    source_workers: int = 8  # parallel source queries per lookup
+    max_in_flight: int = 16  # hashes processed at once in batch mode
+    per_source: Dict[str, int] = field(default_factory=dict)  # e.g. {"virustotal": 4}
+
+@dataclass
+class HttpConfig:
+    pool_connections: int = 10  # distinct hosts kept in each session's pool
+    pool_maxsize: int = 0  # keep-alive connections per host; 0 = size for max_in_flight
+    pool_block: bool = False  # wait for a free connection instead of opening extras
+
+@dataclass
+class ResilienceConfig:
+    breaker_failures: int = 5  # consecutive failed lookups before a source is skipped
+    breaker_cooldown_s: float = 60.0  # how long it is skipped before one probe is let through
+    retry_ratio: float = 0.2  # retries allowed per request, across all sources
+    retry_reserve: int = 10  # retries that can be saved up for a burst of errors
+
+@dataclass
+class TimeoutConfig:
+    deadline_s: float = 0.0  # whole lookup in batch mode; 0 = wait for every source
+    interactive_deadline_s: float = 20.0  # GUI single lookups and CLI --query
+    min_s: float = 3.0  # bounds of the per-request timeout learned from observed latency
+    max_s: float = 30.0
+    hedge: List[str] = field(default_factory=list)  # services whose GETs get a second request past p95
+
+@dataclass
+class MetricsConfig:
+    summary_path: str = "logs/metrics.jsonl"  # one JSON summary line appended per run; "" = off
+    textfile_path: str = ""  # Prometheus textfile for node_exporter's textfile collector; "" = off
+
+KNOWN_GOOD_MODES = ("tag", "hashlookup", "skip")
+
+@dataclass
+class KnownGoodConfig:
+    bloom_path: str = ""  # DCSO-format bloom filter of known-good digests (CIRCL hashlookup/NSRL); "" = off
+    # Known-good hashes: "tag" = look up as usual, "hashlookup" = ask only CIRCL hashlookup, "skip" = no lookups.
+    mode: str = "tag"
+    uppercase: bool = True  # CIRCL's filters hold upper-case hex digests
 
 @dataclass
 class RateLimit:
     requests_per_minute: int = 4
+    burst: int = 1  # requests allowed back-to-back before throttling kicks in
+    max_requests_per_minute: int = 0  # ceiling for adaptive probing; 0 = twice requests_per_minute
 
 @dataclass
 class ServiceConfig:
     enabled: bool = True
     api_key: Optional[str] = None
     rate_limit: RateLimit = field(default_factory=RateLimit)
+    base_url: Optional[str] = None  # send requests to this scheme://host[:port] instead (mock, proxy); paths stay
+
+SCRAPE_MODES = ("auto", "always", "never")
+
+@dataclass
+class VirusTotalConfig(ServiceConfig):
+    # GUI-page scrape: "auto" only when the API report lacks signature_info, tags or names.
+    scrape: str = "auto"
 
 @dataclass
 class AppConfig:
-    virustotal: ServiceConfig = field(default_factory=ServiceConfig)
+    virustotal: VirusTotalConfig = field(default_factory=VirusTotalConfig)
     urlhaus: ServiceConfig = field(default_factory=ServiceConfig)
     malwarebazaar: ServiceConfig = field(default_factory=ServiceConfig)
     malshare: ServiceConfig = field(default_factory=ServiceConfig)
@@ -30,13 +82,22 @@ class AppConfig:
     otx: ServiceConfig = field(default_factory=ServiceConfig)
     threatfox: ServiceConfig = field(default_factory=ServiceConfig)
     cache: CacheConfig = field(default_factory=CacheConfig)
+    concurrency: ConcurrencyConfig = field(default_factory=ConcurrencyConfig)
+    http: HttpConfig = field(default_factory=HttpConfig)
+    resilience: ResilienceConfig = field(default_factory=ResilienceConfig)
+    timeouts: TimeoutConfig = field(default_factory=TimeoutConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    known_good: KnownGoodConfig = field(default_factory=KnownGoodConfig)
     vendor_allowlist: List[str] = field(default_factory=list)
+    vendor_aliases: Dict[str, List[str]] = field(default_factory=dict)  # allowlist name -> VT engine names/globs
+    report_columns: List[str] = field(default_factory=list)  # empty: all of report.REPORT_COLUMNS
 
 def load_config(path: str) -> AppConfig:
     with open(path, "r", encoding="utf-8") as f:
         if path.lower().endswith(".json"):
             raw = json.load(f)
         else:
+            import yaml  # only YAML configs need it
             raw = yaml.safe_load(f)
     def load_service(d: Dict[str, Any]) -> ServiceConfig:
         if d is None:
@@ -45,12 +106,22 @@ def load_config(path: str) -> AppConfig:
         return ServiceConfig(
             enabled=d.get("enabled", True),
             api_key=d.get("api_key"),
+            base_url=d.get("base_url"),
             rate_limit=RateLimit(
-                requests_per_minute=int(rl.get("requests_per_minute", 4))
+                requests_per_minute=int(rl.get("requests_per_minute", 4)),
+                burst=int(rl.get("burst", 1)),
+                max_requests_per_minute=int(rl.get("max_requests_per_minute", 0)),
             )
         )
+    vt_raw = raw.get("virustotal") or {}
+    scrape = str(vt_raw.get("scrape", "auto")).lower()
+    if scrape not in SCRAPE_MODES:
+        raise ValueError(f"virustotal.scrape must be one of {', '.join(SCRAPE_MODES)}, not {scrape!r}")
+    known_good = KnownGoodConfig(**(raw.get("known_good", {}) or {}))
+    if known_good.mode not in KNOWN_GOOD_MODES:
+        raise ValueError(f"known_good.mode must be one of {', '.join(KNOWN_GOOD_MODES)}, not {known_good.mode!r}")
     cfg = AppConfig(
-        virustotal=load_service(raw.get("virustotal", {})),
+        virustotal=VirusTotalConfig(**vars(load_service(vt_raw)), scrape=scrape),
         urlhaus=load_service(raw.get("urlhaus", {})),
         malwarebazaar=load_service(raw.get("malwarebazaar", {})),
         malshare=load_service(raw.get("malshare", {})),
@@ -59,6 +130,15 @@ def load_config(path: str) -> AppConfig:
         otx=load_service(raw.get("otx", {})),
         threatfox=load_service(raw.get("threatfox", {})),
         cache=CacheConfig(**(raw.get("cache", {}) or {})),
-        vendor_allowlist=[v.strip() for v in (raw.get("vendor_allowlist") or []) if v and v.strip()]
+        concurrency=ConcurrencyConfig(**(raw.get("concurrency", {}) or {})),
+        http=HttpConfig(**(raw.get("http", {}) or {})),
+        resilience=ResilienceConfig(**(raw.get("resilience", {}) or {})),
+        timeouts=TimeoutConfig(**(raw.get("timeouts", {}) or {})),
+        metrics=MetricsConfig(**(raw.get("metrics", {}) or {})),
+        known_good=known_good,
+        vendor_allowlist=[v.strip() for v in (raw.get("vendor_allowlist") or []) if v and v.strip()],
+        vendor_aliases={str(k): [v] if isinstance(v, str) else list(v)
+                        for k, v in (raw.get("vendor_aliases") or {}).items()},
+        report_columns=list(raw.get("report_columns") or []),
     )
     return cfg
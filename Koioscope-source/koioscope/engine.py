@@ -0,0 +1,98 @@
+from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Tuple, Union
+
+# process(query, comment) -> merged result row; usually a bound process_one.
+ProcessFn = Callable[[str, str], Dict[str, Any]]
+
+@dataclass
+class Outcome:
+    index: int  # position in the input, to restore order at report time
+    query: str
+    comment: str
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[BaseException] = None
+    answered: bool = False  # came in already answered (e.g. from the cache); passed through as is
+
+_END = object()
+
+async def lookup_batch(items: Iterable[Union[Tuple[str, str], Outcome]], process: ProcessFn,
+                       max_in_flight: int = 16, logger=None) -> AsyncIterator[Outcome]:
+    """
+    Run ``process`` over (query, comment) pairs with up to ``max_in_flight``
+    lookups running at once, yielding each Outcome as soon as it completes.
+    Input is consumed lazily, so only the in-flight window is held in memory,
+    and in a thread, so a slow input (file reads, cache probes, bulk requests)
+    doesn't hold up finished lookups. Outcome items are yielded unchanged.
+    """
+    loop = asyncio.get_running_loop()
+    limit = max(1, max_in_flight)
+    sem = asyncio.Semaphore(limit)
+    done: asyncio.Queue[Outcome] = asyncio.Queue()
+    tasks: set[asyncio.Task] = set()
+    submitted = 0
+
+    with ThreadPoolExecutor(max_workers=limit, thread_name_prefix="koioscope-batch") as pool:
+        async def run(out: Outcome) -> None:
+            try:
+                out.result = await loop.run_in_executor(pool, process, out.query, out.comment)
+            except Exception as e:  # noqa: BLE001
+                if logger:
+                    logger.error("Lookup failed for %s: %s", out.query, e)
+                out.error = e
+            finally:
+                sem.release()
+                await done.put(out)
+
+        async def feed() -> None:
+            nonlocal submitted
+            it = iter(items)
+            i = 0
+            while True:
+                item = await loop.run_in_executor(None, next, it, _END)
+                if item is _END:
+                    return
+                if isinstance(item, Outcome):
+                    submitted += 1
+                    await done.put(item)
+                    continue
+                q, c = item
+                await sem.acquire()
+                t = asyncio.create_task(run(Outcome(i, q, c)))
+                i += 1
+                tasks.add(t)
+                t.add_done_callback(tasks.discard)
+                submitted += 1
+
+        feeder = asyncio.create_task(feed())
+        received = 0
+        try:
+            while True:
+                if feeder.done() and received == submitted:
+                    feeder.result()  # surface input errors
+                    break
+                getter = asyncio.ensure_future(done.get())
+                waits = {getter} if feeder.done() else {getter, feeder}
+                await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    received += 1
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            feeder.cancel()
+            for t in list(tasks):
+                t.cancel()
+
+def run_batch(items: Iterable[Union[Tuple[str, str], Outcome]], process: ProcessFn, on_outcome: Callable[[Outcome], None],
+              max_in_flight: int = 16, logger=None) -> int:
+    """Blocking driver for the CLI/GUI worker thread; returns the number of outcomes."""
+    async def drive() -> int:
+        n = 0
+        async for out in lookup_batch(items, process, max_in_flight, logger):
+            on_outcome(out)
+            n += 1
+        return n
+    return asyncio.run(drive())
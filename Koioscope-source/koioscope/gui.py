@@ -5,8 +5,6 @@ import threading
 import webbrowser
 from typing import List, Dict, Any, Optional
 
-import pandas as pd
-
 # Tkinter
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
@@ -17,18 +15,22 @@ from koioscope.config import load_config, AppConfig
 from koioscope.logging_setup import setup_logging
 from koioscope.vt_client import VirusTotalClient
 from koioscope.utils import detect_hash_type, normalize_hash
-from koioscope.cache import load_from_cache, save_to_cache
-from koioscope.sources import urlhaus, malwarebazaar, otx, threatfox, malshare, hybrid_analysis, hashlookup
-from koioscope.merge import merge_results
-from koioscope.report import write_report, REPORT_COLUMNS
+from koioscope.lookup import lookup_hash
+from koioscope.report import write_report, REPORT_COLUMNS, ResultStore
+from koioscope.engine import Outcome
+from koioscope.batch import run_lookup_batch
+from koioscope.ingest import iter_batch
+from koioscope import metrics
+from koioscope.gui_table import VirtualTable
 
 TABLE_COLUMNS = tuple(REPORT_COLUMNS)
+REFRESH_MS = 250  # how often a running batch's new rows are shown
 
 def process_one(cfg: AppConfig, logger, vt: VirusTotalClient, query: str, comment: str,
-                vendor_list: Optional[List[str]] = None) -> Dict[str, Any]:
+                vendor_list: Optional[List[str]] = None, deadline_s: Optional[float] = None) -> Dict[str, Any]:
     """
     Single lookup: hash or filename (filename best-effort via VT search).
-    Uses cache; writes to cache on success.
+    Reuses cached source responses; only stale or missing sources are re-queried.
     """
     if (ht := detect_hash_type(query)):
         h = normalize_hash(query)
@@ -48,33 +50,8 @@ def process_one(cfg: AppConfig, logger, vt: VirusTotalClient, query: str, commen
                 "source_links": ""
             }
 
-    # Cache
-    cached = load_from_cache(cfg, h)
-    if cached:
-        logger.info("Cache hit (GUI) for %s", h)
-        return cached
-
-    vt_api = vt.fetch_file_report(h) if ht else {}
-    vt_html = vt.scrape_permalink_fields(h) if ht else {}
-
-    md5_hint = None
-    try:
-    	md5_hint = (((vt_api or {}).get("data") or {}).get("attributes") or {}).get("md5")
-    except Exception:
-    	md5_hint = None
-
-    uh = urlhaus.query_hash(cfg, logger, h)
-    mb = malwarebazaar.query_hash(cfg, logger, h)
-    ms = malshare.query_hash(cfg, logger, md5_hint or h)
-    ha = hybrid_analysis.query_hash(cfg, logger, h)
-    hl = hashlookup.query_hash(cfg, logger, h)
-    ox = otx.query_hash(cfg, logger, h)
-    tf = threatfox.query_hash(cfg, logger, h)
-
     vendors = vendor_list if vendor_list else cfg.vendor_allowlist
-    result = merge_results(h, comment, vendors, vt_api, vt_html, uh, mb, ms, ha, hl, ox, tf)
-    save_to_cache(cfg, h, result)
-    return result
+    return lookup_hash(cfg, logger, vt, h, comment, vendors, deadline_s)
 
 
 class HashIntelApp(ttk.Frame):
@@ -89,7 +66,8 @@ class HashIntelApp(ttk.Frame):
         self.vendor_list_path: Optional[str] = None
         self.vendor_list: Optional[List[str]] = None
         self.vt: Optional[VirusTotalClient] = None
-        self.results: List[Dict[str, Any]] = []
+        self.results = ResultStore()  # compact: large batches keep every row for export
+        self._batch_running = False
 
         self._build_ui()
         self._load_config(cfg_path)
@@ -158,21 +136,9 @@ class HashIntelApp(ttk.Frame):
         ttk.Button(frm_btns, text="Export XLSX", command=lambda: self._export("xlsx")).pack(side="left", padx=4)
         ttk.Button(frm_btns, text="Open Permalink", command=self._open_permalink).pack(side="left", padx=4)
 
-        # Table
-        frm_tbl = ttk.Frame(self)
-        frm_tbl.pack(fill="both", expand=True, padx=8, pady=4)
-        self.tree = ttk.Treeview(frm_tbl, columns=TABLE_COLUMNS, show="headings", selectmode="browse")
-        for col in TABLE_COLUMNS:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=160 if col != "indicator_tags" else 220, stretch=True)
-        vsb = ttk.Scrollbar(frm_tbl, orient="vertical", command=self.tree.yview)
-        hsb = ttk.Scrollbar(frm_tbl, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscroll=vsb.set, xscroll=hsb.set)
-        self.tree.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
-        hsb.grid(row=1, column=0, sticky="ew")
-        frm_tbl.rowconfigure(0, weight=1)
-        frm_tbl.columnconfigure(0, weight=1)
+        # Table: only the visible rows are in the widget; the rest stay in self.results.
+        self.table = VirtualTable(self, self.results, TABLE_COLUMNS, {"indicator_tags": 220})
+        self.table.pack(fill="both", expand=True, padx=8, pady=4)
 
         # Status bar
         self.var_status = tk.StringVar(value="Ready")
@@ -207,7 +173,7 @@ class HashIntelApp(ttk.Frame):
 
     def _browse_batch(self) -> None:
         p = filedialog.askopenfilename(title="Choose batch CSV/XLSX",
-                                       filetypes=[("CSV/XLSX", "*.csv *.xlsx"), ("All Files", "*.*")])
+                                       filetypes=[("Batch files", "*.csv *.xlsx *.txt *.gz"), ("All Files", "*.*")])
         if p:
             self.var_b.set(p)
 
@@ -248,19 +214,21 @@ class HashIntelApp(ttk.Frame):
         except Exception as e:  # noqa: BLE001
             messagebox.showerror("Export", f"Failed: {e}")
 
-    def _add_table_row(self, res: Dict[str, Any]) -> None:
-        vals = tuple(res.get(col, "") for col in TABLE_COLUMNS)
-        self.tree.insert("", "end", values=vals)
+    def _poll_batch(self) -> None:
+        """Show a running batch's new rows in one repaint per tick instead of one event per row."""
+        self.table.refresh()
+        if self._batch_running:
+            self._set_status(f"Running batch... {len(self.results)} rows")
+            self.after(REFRESH_MS, self._poll_batch)
 
     def _open_permalink(self) -> None:
-        sel = self.tree.selection()
-        if not sel:
+        idx = self.table.selected
+        if idx is None:
             messagebox.showinfo("Open Permalink", "Select a row first.")
             return
-        idx = self.tree.index(sel[0])
         if idx < 0 or idx >= len(self.results):
             return
-        links = self.results[idx].get("source_links","")
+        links = self.results.get(idx, "source_links")
         if not links:
             messagebox.showinfo("Open Permalink", "No link found for this row.")
             return
@@ -284,9 +252,11 @@ class HashIntelApp(ttk.Frame):
 
     def _run_single_worker(self, q: str, c: str) -> None:
         try:
-            res = process_one(self.cfg, self.logger, self.vt, q, c, self.vendor_list)
+            # Bounded wait: sources that miss the deadline are flagged and cached when they answer.
+            res = process_one(self.cfg, self.logger, self.vt, q, c, self.vendor_list,
+                              self.cfg.timeouts.interactive_deadline_s)
             self.results.append(res)
-            self.after(0, lambda: self._add_table_row(res))
+            self.after(0, self.table.refresh)
             self.after(0, lambda: self._set_status("Done"))
         except Exception as e:  # noqa: BLE001
             self.after(0, lambda: messagebox.showerror("Run Single", f"Error: {e}"))
@@ -304,27 +274,30 @@ class HashIntelApp(ttk.Frame):
             messagebox.showerror("Config", "Load a valid config first.")
             return
         self._set_status("Running batch...")
+        self._batch_running = True
         t = threading.Thread(target=self._run_batch_worker, args=(p,), daemon=True)
         t.start()
+        self.after(REFRESH_MS, self._poll_batch)
 
     def _run_batch_worker(self, path: str) -> None:
         try:
-            if path.lower().endswith(".xlsx"):
-                df = pd.read_excel(path)
-            else:
-                df = pd.read_csv(path)
-            count = 0
-            for _, r in df.iterrows():
-                h = str(r.get("hash","")).strip()
-                c = str(r.get("comment","")).strip() if "comment" in df.columns else ""
-                if not h:
-                    continue
-                res = process_one(self.cfg, self.logger, self.vt, h, c, self.vendor_list)
-                self.results.append(res)
-                self.after(0, lambda rr=res: self._add_table_row(rr))
-                count += 1
+            items = iter_batch(path, self.logger)
+
+            base = self.results.next_key  # exports follow input order, not completion order
+
+            def on_outcome(out: Outcome) -> None:
+                # Shown by _poll_batch; no Tk call per row.
+                self.results.append(out.result or {"hash": out.query, "comment": out.comment}, base + out.index)
+
+            count = run_lookup_batch(self.cfg, self.logger, items,
+                                     lambda q, c: process_one(self.cfg, self.logger, self.vt, q, c, self.vendor_list),
+                                     on_outcome, self.vendor_list or self.cfg.vendor_allowlist)
+            metrics.emit(self.cfg, self.logger, run=os.path.basename(path), rows=count)
+            self._batch_running = False
+            self.after(0, self.table.refresh)
             self.after(0, lambda: self._set_status(f"Batch done ({count} items)"))
         except Exception as e:  # noqa: BLE001
+            self._batch_running = False
             self.after(0, lambda: messagebox.showerror("Run Batch", f"Error: {e}"))
             self.after(0, lambda: self._set_status("Error"))
 
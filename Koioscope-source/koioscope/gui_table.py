@@ -0,0 +1,165 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import tkinter as tk
+from tkinter import ttk
+
+class Viewport:
+    """Which slice of ``total`` rows a window of ``page`` rows shows, starting at ``first``."""
+    def __init__(self, page: int = 1):
+        self.total = 0
+        self.page = max(1, page)
+        self.first = 0
+
+    def update(self, total: int, page: Optional[int] = None) -> None:
+        self.total = max(0, total)
+        if page is not None:
+            self.page = max(1, page)
+        self._clamp()
+
+    def _clamp(self) -> None:
+        self.first = max(0, min(self.first, self.total - self.page))
+
+    def scroll(self, rows: int) -> None:
+        self.first += rows
+        self._clamp()
+
+    def moveto(self, fraction: float) -> None:
+        self.first = int(float(fraction) * self.total)
+        self._clamp()
+
+    def show(self, i: int) -> None:
+        """Scroll just enough for row ``i`` to be on screen."""
+        if i < self.first:
+            self.first = i
+        elif i >= self.first + self.page:
+            self.first = i - self.page + 1
+        self._clamp()
+
+    def window(self) -> range:
+        return range(self.first, min(self.total, self.first + self.page))
+
+    def fraction(self) -> Tuple[float, float]:
+        """Scrollbar thumb position, as ttk.Scrollbar.set wants it."""
+        if not self.total:
+            return 0.0, 1.0
+        w = self.window()
+        return w.start / self.total, w.stop / self.total
+
+class VirtualTable(ttk.Frame):
+    """
+    A Treeview that only ever holds the rows on screen. Rows are read from
+    ``source`` (anything with ``len()`` and ``values(i, columns)``, e.g. a
+    report.ResultStore); the vertical scrollbar spans all of them and
+    scrolling repaints the fixed set of on-screen items, so the widget costs
+    the same with 100 rows or a million. Call ``refresh()`` after rows are
+    added (the app does it on a timer, not per row).
+    """
+    WHEEL_ROWS = 3
+
+    def __init__(self, master: tk.Misc, source: Any, columns: Sequence[str], widths: Dict[str, int]):
+        super().__init__(master)
+        self.source = source
+        self.columns = tuple(columns)
+        self.view = Viewport()
+        self.selected: Optional[int] = None  # absolute row index
+        self._painted: Optional[Tuple[int, int]] = None
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings", selectmode="browse")
+        for col in self.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=widths.get(col, 160), stretch=True)
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscroll=hsb.set)  # no yscroll: the tree itself never scrolls
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.vsb.grid(row=0, column=1, sticky="ns")
+        hsb.grid(row=1, column=0, sticky="ew")
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", lambda e: self.refresh())
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll(-self.WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self._scroll(self.WHEEL_ROWS))
+        self.tree.bind("<Button-1>", self._on_click)
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-page"), ("<Next>", "page"),
+                          ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(key, lambda e, s=step: self._on_key(s))
+
+    def _page_rows(self) -> int:
+        height = self.tree.winfo_height()
+        if height <= 1:  # not mapped yet
+            return self.view.page if self._painted else 50
+        children = self.tree.get_children()
+        box = self.tree.bbox(children[0]) if children else None
+        if box:
+            top, row = box[1], box[3]
+        else:
+            row = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+            top = row + 4  # heading
+        return max(1, (height - top) // max(1, row))
+
+    def invalidate(self) -> None:
+        """Repaint on the next refresh even if the window didn't move (rows were replaced)."""
+        self._painted = None
+
+    def refresh(self) -> None:
+        self.view.update(len(self.source), self._page_rows())
+        rows = self.view.window()
+        if (rows.start, rows.stop) != self._painted:
+            slots = self.tree.get_children()
+            if len(slots) > len(rows):
+                self.tree.delete(*slots[len(rows):])
+            for k in range(len(slots), len(rows)):
+                self.tree.insert("", "end", iid=str(k))
+            for k, i in enumerate(rows):
+                self.tree.item(str(k), values=self.source.values(i, self.columns))
+            self._painted = (rows.start, rows.stop)
+            self._show_selection()
+        self.vsb.set(*self.view.fraction())
+
+    def _show_selection(self) -> None:
+        rows = self.view.window()
+        if self.selected is not None and self.selected in rows:
+            self.tree.selection_set(str(self.selected - rows.start))
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+    def _scroll(self, rows: int) -> str:
+        self.view.scroll(rows)
+        self.refresh()
+        return "break"
+
+    def _on_scrollbar(self, *args: str) -> None:
+        if args[0] == "moveto":
+            self.view.moveto(float(args[1]))
+        elif args[0] == "scroll":
+            n = int(args[1])
+            self.view.scroll(n * self.view.page if args[2] == "pages" else n)
+        self.refresh()
+
+    def _on_wheel(self, event: tk.Event) -> str:
+        # Windows reports multiples of 120 per notch, macOS small deltas.
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._scroll(-notches * self.WHEEL_ROWS)
+
+    def _on_click(self, event: tk.Event) -> None:
+        slot = self.tree.identify_row(event.y)
+        if slot:
+            self.selected = self.view.first + int(slot)
+
+    def _on_key(self, step: Any) -> str:
+        last = len(self.source) - 1
+        if last < 0:
+            return "break"
+        cur = self.view.first if self.selected is None else self.selected
+        if isinstance(step, int):
+            target = cur + step
+        else:
+            target = {"page": cur + self.view.page, "-page": cur - self.view.page, "home": 0, "end": last}[step]
+        self.selected = max(0, min(last, target))
+        self.view.show(self.selected)
+        self.refresh()
+        self._show_selection()
+        return "break"
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import threading, time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import TYPE_CHECKING, Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from .config import AppConfig
+from . import metrics, profiling
+
+if TYPE_CHECKING:
+    import requests
+    from .ratelimit import TokenBucket
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def pool_size(cfg: AppConfig) -> int:
+    """Keep-alive connections per host; auto-sized to the batch concurrency when unset."""
+    if cfg.http.pool_maxsize > 0:
+        return cfg.http.pool_maxsize
+    # VT takes two calls per hash (API + permalink), the rest one each.
+    return max(10, 2 * cfg.concurrency.max_in_flight)
+
+def _new_session(cfg: AppConfig) -> requests.Session:
+    # Imported here so that starting the CLI for a cached answer doesn't pay for requests.
+    import requests
+    from requests.adapters import HTTPAdapter
+    s = requests.Session()
+    # Retries are handled by utils.with_backoff, so the adapter never retries.
+    adapter = HTTPAdapter(pool_connections=cfg.http.pool_connections,
+                          pool_maxsize=pool_size(cfg),
+                          pool_block=cfg.http.pool_block,
+                          max_retries=0)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+def session_for(cfg: AppConfig, url: str) -> requests.Session:
+    """Shared keep-alive session for the host of ``url``; safe to use from many threads."""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}".lower()
+    with _sessions_lock:
+        s = _sessions.get(key)
+        if s is None:
+            s = _sessions[key] = _new_session(cfg)
+        return s
+
+class LatencyTracker:
+    """Recent round-trip times of one service, for timeouts and hedging."""
+    MIN_SAMPLES = 20
+
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The ``q`` quantile (0-1) of recent latencies, or None until enough are seen."""
+        with self._lock:
+            if len(self._samples) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self, cfg: AppConfig, default: float) -> float:
+        """3x the observed p99, within timeouts.min_s..max_s; ``default`` until there is data."""
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return default
+        return min(cfg.timeouts.max_s, max(cfg.timeouts.min_s, 3 * p99))
+
+_trackers: Dict[str, LatencyTracker] = {}
+_hedge_pool: Optional[Tuple[int, ThreadPoolExecutor]] = None
+
+def tracker_for(service: str) -> LatencyTracker:
+    with _sessions_lock:
+        t = _trackers.get(service)
+        if t is None:
+            t = _trackers[service] = LatencyTracker()
+        return t
+
+def _hedged(cfg: AppConfig, service: str) -> bool:
+    return service in cfg.timeouts.hedge or service.split("/")[0] in cfg.timeouts.hedge
+
+def hedge_pool(cfg: AppConfig) -> ThreadPoolExecutor:
+    """
+    Threads for hedged GETs: two (the primary and its hedge) for each hedged
+    call an in-flight lookup can make at once, so a hedge never queues behind
+    the primaries it is meant to beat. "virustotal" covers two calls per hash
+    (the API and the permalink page).
+    """
+    global _hedge_pool
+    calls = sum(2 if s == "virustotal" else 1 for s in cfg.timeouts.hedge)
+    size = 2 * max(1, cfg.concurrency.max_in_flight) * max(1, calls)
+    with _sessions_lock:
+        if _hedge_pool is None or _hedge_pool[0] != size:
+            if _hedge_pool is not None:
+                _hedge_pool[1].shutdown(wait=False)  # running requests finish on the old threads
+            _hedge_pool = (size, ThreadPoolExecutor(max_workers=size, thread_name_prefix="koioscope-hedge"))
+        return _hedge_pool[1]
+
+def _hedged_get(pool: ThreadPoolExecutor, session: requests.Session, url: str, kw: Dict[str, Any], after_s: float,
+                limiter: Optional[TokenBucket]) -> requests.Response:
+    started = threading.Event()
+    def primary() -> requests.Response:
+        started.set()
+        return session.get(url, **kw)
+    first = pool.submit(primary)
+    started.wait()  # time spent queued for a thread doesn't count towards the p95
+    try:
+        return first.result(timeout=after_s)
+    except FutureTimeout:
+        pass
+    if limiter is not None and not limiter.try_acquire():
+        return first.result()  # no spare quota for a second request
+    pending = {first, pool.submit(session.get, url, **kw)}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                return f.result()  # the other request finishes in the background, unused
+            error = f.exception()
+    raise error  # type: ignore[misc]
+
+def rebase(url: str, base_url: str) -> str:
+    """``url`` with its scheme://host replaced by ``base_url``."""
+    parts = urlsplit(url)
+    return base_url.rstrip("/") + url[len(f"{parts.scheme}://{parts.netloc}"):]
+
+def request(cfg: AppConfig, service: str, method: str, url: str, *, timeout: Optional[float] = None,
+            default_timeout: float = 20.0, limiter: Optional[TokenBucket] = None, **kw) -> requests.Response:
+    """
+    One call through the shared session for ``url``'s host. ``service`` names the
+    config section (and, after a "/", a separately timed endpoint, e.g. "hashlookup/bulk");
+    its base_url, if set, replaces the host. Unless ``timeout`` is given, it follows
+    the endpoint's observed latency. GETs to services (or whole config sections)
+    listed in timeouts.hedge are sent a second time once they outlast the p95, if
+    ``limiter`` has a token to spare; whichever answers first wins.
+    """
+    base_url = getattr(getattr(cfg, service.split("/")[0], None), "base_url", None)
+    if base_url:
+        url = rebase(url, base_url)
+    tracker = tracker_for(service)
+    kw["timeout"] = timeout or tracker.timeout(cfg, default_timeout)
+    session = session_for(cfg, url)
+    p95 = tracker.percentile(0.95)
+    t0 = time.monotonic()
+    try:
+        if method == "GET" and _hedged(cfg, service) and p95 is not None:
+            resp = _hedged_get(hedge_pool(cfg), session, url, kw, p95, limiter)
+        else:
+            resp = session.request(method, url, **kw)
+    except Exception as e:
+        import requests
+        if isinstance(e, requests.Timeout):
+            # Count it at the timeout: left out, slow spells would pull p99 (and the timeout) down.
+            tracker.record(kw["timeout"])
+        metrics.inc("requests", service=service, status="error")
+        metrics.observe(service, time.monotonic() - t0)
+        profiling.record("network", time.monotonic() - t0)
+        raise
+    elapsed = time.monotonic() - t0
+    tracker.record(elapsed)
+    profiling.record("network", elapsed)
+    metrics.inc("requests", service=service, status=str(resp.status_code))
+    metrics.observe(service, elapsed)
+    return resp
+
+def close_sessions() -> None:
+    with _sessions_lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import csv, gzip, logging, os, re
+from typing import IO, Iterator, Optional, Tuple
+from .utils import detect_hash_type, normalize_hash
+
+_HEX_RE = re.compile(r"^[a-fA-F0-9]+$")
+
+def clean_query(raw: object, logger: Optional[logging.Logger] = None) -> Optional[str]:
+    """
+    Normalize one input cell: hashes are lower-cased, anything else is kept as a
+    filename query. Hex strings of the wrong length are typos, not filenames, and are dropped.
+    """
+    if raw is None:
+        return None
+    s = str(raw).strip()
+    if not s:
+        return None
+    if detect_hash_type(s):
+        return normalize_hash(s)
+    if _HEX_RE.match(s):
+        if logger:
+            logger.warning("Skipping malformed hash %r (length %d)", s, len(s))
+        return None
+    return s
+
+def _open_text(path: str) -> IO[str]:
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+def _inner_ext(path: str) -> str:
+    p = path.lower()
+    if p.endswith(".gz"):
+        p = p[:-3]
+    return os.path.splitext(p)[1].lstrip(".")
+
+def _iter_csv(f: IO[str]) -> Iterator[Tuple[object, object]]:
+    reader = csv.reader(f)
+    header = [h.strip().lower() for h in next(reader, [])]
+    if "hash" not in header:
+        raise ValueError("batch file has no 'hash' column")
+    hi = header.index("hash")
+    ci = header.index("comment") if "comment" in header else None
+    for row in reader:
+        if len(row) > hi:
+            yield row[hi], (row[ci] if ci is not None and len(row) > ci else "")
+
+def _iter_txt(f: IO[str]) -> Iterator[Tuple[object, object]]:
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line, ""
+
+def _iter_xlsx(path: str) -> Iterator[Tuple[object, object]]:
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h).strip().lower() if h is not None else "" for h in next(rows, ())]
+        if "hash" not in header:
+            raise ValueError("batch file has no 'hash' column")
+        hi = header.index("hash")
+        ci = header.index("comment") if "comment" in header else None
+        for row in rows:
+            if len(row) > hi:
+                yield row[hi], (row[ci] if ci is not None and len(row) > ci else "")
+    finally:
+        wb.close()
+
+def _rows(path: str) -> Iterator[Tuple[object, object]]:
+    ext = _inner_ext(path)
+    if ext == "xlsx":
+        yield from _iter_xlsx(path)
+        return
+    with _open_text(path) as f:
+        # Anything that isn't .txt is read as CSV, as before.
+        yield from (_iter_txt(f) if ext == "txt" else _iter_csv(f))
+
+def iter_batch(path: str, logger: Optional[logging.Logger] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (query, comment) pairs from a batch file without loading it whole:
+    CSV with a hash[,comment] header, XLSX (first sheet, read-only mode), or .txt
+    with one hash per line. CSV and text may be gzip-compressed (.csv.gz, .txt.gz).
+    """
+    for q, c in _rows(path):
+        query = clean_query(q, logger)
+        if query:
+            yield query, "" if c is None else str(c).strip()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+import hashlib, json, os, sqlite3, time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Set
+from .config import AppConfig
+
+if TYPE_CHECKING:
+    from .engine import Outcome
+
+JOURNAL_NAME = "runs.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    input_path TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    out_path TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    run_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    comment TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    PRIMARY KEY (run_id, row_index)
+);
+"""
+
+def journal_path(cfg: AppConfig) -> str:
+    return os.path.join(cfg.cache.dir, JOURNAL_NAME)
+
+def connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def fingerprint(path: str) -> str:
+    """sha256 of the input file, so a resumed run is known to see the same rows."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def default_run_id(input_path: str, fp: str) -> str:
+    return f"{os.path.basename(input_path)}-{fp[:12]}"
+
+def start_run(conn: sqlite3.Connection, run_id: str, input_path: str, fp: str,
+              out_path: Optional[str] = None, resume: bool = False) -> Set[int]:
+    """
+    Open ``run_id`` in the journal and return the row indices already completed.
+    Without ``resume`` any earlier record of the run is discarded and the set is empty.
+    """
+    row = conn.execute("SELECT fingerprint FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    if row and resume and row[0] != fp:
+        raise ValueError(f"run {run_id!r} was started on a different version of {input_path}")
+    if row and not resume:
+        conn.execute("DELETE FROM rows WHERE run_id = ?", (run_id,))
+    conn.execute(
+        "INSERT INTO runs(run_id, input_path, fingerprint, out_path, started_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(run_id) DO UPDATE SET input_path = excluded.input_path, fingerprint = excluded.fingerprint, "
+        "out_path = excluded.out_path, finished_at = NULL",
+        (run_id, os.path.abspath(input_path), fp, out_path, time.time()))
+    if not (row and resume):
+        return set()
+    return {i for (i,) in conn.execute(
+        "SELECT row_index FROM rows WHERE run_id = ? AND status = 'done'", (run_id,))}
+
+def record(conn: sqlite3.Connection, run_id: str, out: Outcome) -> None:
+    """Checkpoint one finished row; failed rows are retried by the next --resume."""
+    ok = out.error is None
+    conn.execute(
+        "INSERT OR REPLACE INTO rows(run_id, row_index, query, comment, status, result, error) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (run_id, out.index, out.query, out.comment or "", "done" if ok else "failed",
+         json.dumps(out.result or {}, ensure_ascii=False) if ok else None,
+         None if ok else str(out.error)))
+
+def finish_run(conn: sqlite3.Connection, run_id: str) -> None:
+    conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+def counts(conn: sqlite3.Connection, run_id: str) -> Dict[str, int]:
+    return dict(conn.execute(
+        "SELECT status, COUNT(*) FROM rows WHERE run_id = ? GROUP BY status", (run_id,)).fetchall())
+
+def iter_rows(conn: sqlite3.Connection, run_id: str) -> Iterator[Dict[str, Any]]:
+    """Report rows of a run in input order; failed rows yield a bare hash/comment row."""
+    for query, comment, result in conn.execute(
+            "SELECT query, comment, result FROM rows WHERE run_id = ? ORDER BY row_index", (run_id,)):
+        yield json.loads(result) if result else {"hash": query, "comment": comment}
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import math, mmap, os, struct, threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from .config import AppConfig
+
+# Tag added to indicator_tags for hashes found in the known-good filter.
+KNOWN_GOOD_TAG = "KnownGood"
+
+# Sources still asked about a known-good hash, by known_good.mode (None = all of them).
+MODE_SOURCES: Dict[str, Optional[Tuple[str, ...]]] = {"tag": None, "hashlookup": ("hashlookup",), "skip": ()}
+
+# DCSO bloom file format (github.com/DCSO/bloom, also read by their Python "flor"):
+# little-endian u64 version flags (1), capacity n, f64 error rate p, hash count k,
+# bit count m, element count N; then ceil(m/64) u64 words of bits; then free-form data.
+# Keys are hashed with 64-bit FNV-1 and stretched to k bit positions by a
+# multiplicative generator modulo the largest 64-bit prime.
+_HEADER = struct.Struct("<QQdQQQ")
+_FNV_OFFSET = 14695981039346656037
+_FNV_PRIME = 1099511628211
+_M64 = 18446744073709551557
+_G64 = 18446744073709550147
+_MASK = 0xFFFFFFFFFFFFFFFF
+
+def _positions(value: bytes, k: int, m: int) -> List[int]:
+    h, prime, mask = _FNV_OFFSET, _FNV_PRIME, _MASK
+    for b in value:
+        h = ((h * prime) & mask) ^ b
+    h %= _M64
+    out = []
+    for _ in range(k):
+        h = ((h * _G64) & mask) % _M64
+        out.append(h % m)
+    return out
+
+class BloomFilter:
+    """
+    A DCSO-format bloom filter, memory-mapped read-only: opening a multi-GB
+    filter costs nothing up front and a test touches only k pages. False
+    positives happen at the filter's error rate; there are no false negatives.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f"{path}: not a bloom filter (too short)")
+        flags, self.n, self.p, self.k, self.m, self.count = _HEADER.unpack_from(self._mm)
+        if flags & 0xFF != 1 or not self.m or not self.k:
+            raise ValueError(f"{path}: not a DCSO bloom filter (version {flags & 0xFF})")
+        if len(self._mm) < _HEADER.size + math.ceil(self.m / 64) * 8:
+            raise ValueError(f"{path}: truncated ({len(self._mm)} bytes for {self.m} bits)")
+
+    def __contains__(self, value: str) -> bool:
+        mm, base = self._mm, _HEADER.size
+        for i in _positions(value.encode(), self.k, self.m):
+            if not mm[base + (i >> 3)] & (1 << (i & 7)):
+                return False
+        return True
+
+    def close(self) -> None:
+        self._mm.close()
+
+def write_filter(path: str, values: Iterable[str], p: float = 0.001, n: Optional[int] = None) -> None:
+    """Build a DCSO-format filter of ``values`` (room for ``n``, default their count)."""
+    values = list(values)
+    n = max(1, n or len(values))
+    m = int(abs(math.ceil(n * math.log(p) / math.log(2) ** 2)))  # sized as DCSO's tools do
+    k = int(math.ceil(math.log(2) * m / n))
+    bits = bytearray(math.ceil(m / 64) * 8)
+    for v in values:
+        for i in _positions(v.encode(), k, m):
+            bits[i >> 3] |= 1 << (i & 7)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(1, n, p, k, m, len(values)))
+        f.write(bits)
+
+_filters: Dict[str, BloomFilter] = {}
+_lock = threading.Lock()
+
+def filter_for(cfg: AppConfig) -> Optional[BloomFilter]:
+    """The process-wide filter at known_good.bloom_path, mapped on first use; None when unset."""
+    path = cfg.known_good.bloom_path
+    if not path:
+        return None
+    with _lock:
+        bf = _filters.get(path)
+        if bf is None:
+            bf = _filters[path] = BloomFilter(path)
+        return bf
+
+def is_known(cfg: AppConfig, h: str) -> bool:
+    """Whether digest ``h`` is in the known-good filter (a few microseconds; False without one)."""
+    bf = filter_for(cfg)
+    if bf is None:
+        return False
+    return (h.upper() if cfg.known_good.uppercase else h.lower()) in bf
+
+def sources_for(cfg: AppConfig, h: str) -> Optional[Tuple[str, ...]]:
+    """The sources worth asking about ``h`` (raw-response keys), or None for all of them."""
+    only = MODE_SOURCES[cfg.known_good.mode]
+    if only is None or not is_known(cfg, h):
+        return None
+    return only
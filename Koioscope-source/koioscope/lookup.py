@@ -0,0 +1,338 @@
+from __future__ import annotations
+import threading, time
+from concurrent.futures import Future, TimeoutError as FutureTimeout, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import AppConfig
+from .vt_client import VirusTotalClient, permalink
+from .sources import urlhaus, malwarebazaar, otx, threatfox, malshare, hybrid_analysis, hashlookup
+from .merge import MergePolicy, merge_results, policy_for
+from .resilience import breaker_for
+from . import knowngood, metrics, profiling
+from .cache import (load_from_cache, load_raw, load_raw_many, save_raw, save_raw_many, service_of,
+                    save_aliases, resolve_alias)
+
+# Keys of the raw-response dict, in merge_results argument order.
+SOURCE_KEYS = ("vt_api", "vt_html", "urlhaus", "malwarebazaar", "malshare",
+               "hybrid_analysis", "hashlookup", "otx", "threatfox")
+
+# Sources that only need the hash itself (MalShare needs VT's md5, see below).
+INDEPENDENT_SOURCES = (
+    ("urlhaus", urlhaus.fetch),
+    ("malwarebazaar", malwarebazaar.fetch),
+    ("hybrid_analysis", hybrid_analysis.fetch),
+    ("hashlookup", hashlookup.fetch),
+    ("otx", otx.fetch),
+    ("threatfox", threatfox.fetch),
+)
+
+# Source modules by raw-response key; those defining query_many(cfg, logger, hashes)
+# can answer many hashes per request and are used by prefetch_bulk.
+SOURCE_MODULES = {
+    "urlhaus": urlhaus, "malwarebazaar": malwarebazaar, "malshare": malshare,
+    "hybrid_analysis": hybrid_analysis, "hashlookup": hashlookup, "otx": otx, "threatfox": threatfox,
+}
+
+# VT attributes merge_results reads (plus the digests); the rest of the report isn't cached.
+_VT_ATTRS = ("last_analysis_stats", "last_analysis_results", "names", "signature_info",
+             "signature_description", "pe_original_filename", "authentihash",
+             "first_submission_date", "last_submission_date", "tags",
+             "popular_threat_classification", "md5", "sha1", "sha256")
+
+# Sources whose answer doesn't depend on which digest they were asked with
+# (URLHaus only understands sha256), so they can be reused across aliases.
+DIGEST_AGNOSTIC = frozenset(SOURCE_KEYS) - {"urlhaus"}
+
+class SourcePool:
+    """
+    Runs one lookup's source queries, ``workers`` at a time, on daemon threads.
+    Sources still running at the deadline finish in the background without
+    keeping the process alive: ThreadPoolExecutor threads are joined at exit,
+    so a --query run would otherwise last as long as its slowest source.
+    """
+    def __init__(self, workers: int):
+        self._sem = threading.BoundedSemaphore(max(1, workers))
+
+    def submit(self, fn: Callable[..., Dict[str, Any]], *args) -> Future:
+        fut: Future = Future()
+        def run() -> None:
+            with self._sem:
+                if not fut.set_running_or_notify_cancel():
+                    return
+                try:
+                    fut.set_result(fn(*args))
+                except BaseException as e:  # noqa: BLE001
+                    fut.set_exception(e)
+        threading.Thread(target=run, name="koioscope-src", daemon=True).start()
+        return fut
+
+@dataclass
+class SourceResults:
+    raw: Dict[str, Dict[str, Any]]
+    failed: List[str] = field(default_factory=list)  # errored this time; not cached
+    skipped: List[str] = field(default_factory=list)  # circuit open; not asked at all
+    late: List[str] = field(default_factory=list)  # still running at the deadline; cached when they answer
+    cached: List[str] = field(default_factory=list)  # served from the raw cache
+    fetched: List[str] = field(default_factory=list)  # asked over the network this time
+
+_slots: Dict[str, Tuple[int, threading.BoundedSemaphore]] = {}
+_slots_lock = threading.Lock()
+
+def _slot(cfg: AppConfig, service: str) -> threading.BoundedSemaphore | None:
+    """Process-wide cap on concurrent calls to one service (concurrency.per_source)."""
+    limit = cfg.concurrency.per_source.get(service)
+    if not limit:
+        return None
+    with _slots_lock:
+        cur = _slots.get(service)
+        if cur is None or cur[0] != limit:
+            cur = _slots[service] = (limit, threading.BoundedSemaphore(limit))
+        return cur[1]
+
+def _call(cfg: AppConfig, service: str, fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+    sem = _slot(cfg, service)
+    if sem is None:
+        return fn(*args)
+    with sem:
+        return fn(*args)
+
+def empty_sources() -> Dict[str, Dict[str, Any]]:
+    return {k: {} for k in SOURCE_KEYS}
+
+def md5_hint(vt_api: Dict[str, Any]) -> str | None:
+    try:
+        return (((vt_api or {}).get("data") or {}).get("attributes") or {}).get("md5")
+    except Exception:
+        return None
+
+def wants_scrape(mode: str, vt_api: Dict[str, Any]) -> bool:
+    """
+    Whether the VT GUI page is worth a second VT request: always/never as
+    configured; in "auto" only when the API knows the file but its report
+    lacks signature_info, tags or names.
+    """
+    if mode != "auto":
+        return mode == "always"
+    attrs = ((vt_api or {}).get("data") or {}).get("attributes") or {}
+    return bool(attrs) and not all(attrs.get(k) for k in ("signature_info", "tags", "names"))
+
+def compact_vt(vt_api: Dict[str, Any]) -> Dict[str, Any]:
+    """Trim a VT file report to what merge_results needs before it is cached."""
+    data = (vt_api or {}).get("data")
+    if not isinstance(data, dict):
+        return vt_api
+    attrs = data.get("attributes") or {}
+    keep = {k: attrs[k] for k in _VT_ATTRS if k in attrs}
+    results = keep.get("last_analysis_results")
+    if isinstance(results, dict):
+        keep["last_analysis_results"] = {k: {"category": v.get("category", "")}
+                                         for k, v in results.items() if isinstance(v, dict)}
+    return {"data": {"id": data.get("id"), "type": data.get("type"), "attributes": keep}}
+
+def _cacheable(payload: Dict[str, Any]) -> bool:
+    # Auth/permission errors come back as {"error": ...}; re-ask once the key is fixed.
+    return isinstance(payload, dict) and "error" not in payload
+
+def _fill_in(cfg: AppConfig, h: str, key: str, fut: Future, res: SourceResults) -> None:
+    """Cache an answer that arrived after its lookup's deadline, for the next lookup."""
+    try:
+        payload = fut.result()
+        if key not in res.failed and key not in res.skipped and _cacheable(payload):
+            save_raw(cfg, h, {key: compact_vt(payload) if key == "vt_api" else payload})
+    except Exception:  # noqa: BLE001
+        pass
+
+def query_sources(cfg: AppConfig, logger, vt: VirusTotalClient, h: str,
+                  deadline_s: Optional[float] = None, only: Optional[Tuple[str, ...]] = None) -> SourceResults:
+    """
+    Fill in raw responses for one hash: fresh ones come from the raw cache,
+    stale or missing ones are fetched concurrently and cached.
+    MalShare waits for the VT report, since it needs the md5 digest; so does
+    the VT page scrape unless virustotal.scrape is "always" (see wants_scrape).
+    With ``deadline_s``, returns whatever answered in time; the rest are listed
+    in ``late`` and cached in the background when they arrive. ``only``
+    limits the sources fetched (see knowngood.sources_for).
+    """
+    with profiling.stage("cache"):
+        fresh = load_raw(cfg, h)
+    res = SourceResults(raw=empty_sources(), cached=[k for k in SOURCE_KEYS if k in fresh])
+    res.raw.update(fresh)
+    todo = [k for k in SOURCE_KEYS if k not in fresh and getattr(cfg, service_of(k)).enabled
+            and (only is None or k in only)]
+    for k in res.cached:
+        metrics.inc("cache_hits", source=k)
+    for k in todo:
+        metrics.inc("cache_misses", source=k)
+    if not todo:
+        return res
+
+    fetchers: Dict[str, Callable[[str], Dict[str, Any]]] = {
+        "vt_api": vt.get_file_report,
+        "vt_html": vt.scrape_permalink_fields,
+        "malshare": lambda x: malshare.fetch(cfg, logger, x),
+    }
+    for name, fn in INDEPENDENT_SOURCES:
+        fetchers[name] = lambda x, fn=fn: fn(cfg, logger, x)
+
+    def run(key: str, arg: str) -> Dict[str, Any]:
+        breaker = breaker_for(cfg, key)
+        if not breaker.allow():
+            res.skipped.append(key)
+            return {}
+        try:
+            out = _call(cfg, service_of(key), fetchers[key], arg)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("%s query failed for %s: %s", key, arg, e)
+            res.failed.append(key)
+            if breaker.failure():
+                logger.warning("%s: %d failures in a row; skipping it for %.0fs",
+                               key, breaker.failures, breaker.cooldown_s)
+            return {}
+        breaker.success()
+        return out
+
+    deadline = time.monotonic() + deadline_s if deadline_s else None
+    def left() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    mode = cfg.virustotal.scrape
+    after_vt = {"malshare", "vt_html"} if mode != "always" else {"malshare"}
+    ex = SourcePool(cfg.concurrency.source_workers)
+    futs = {k: ex.submit(run, k, h) for k in todo if k not in after_vt}
+    local: Dict[str, Dict[str, Any]] = {}
+    if after_vt & set(todo):
+        try:
+            vt_api = futs["vt_api"].result(timeout=left()) if "vt_api" in futs else res.raw["vt_api"]
+        except FutureTimeout:  # out of time before VT answered; its dependants aren't started
+            res.late.extend(k for k in todo if k in after_vt)
+            vt_api = None
+        if vt_api is not None and "malshare" in todo:
+            futs["malshare"] = ex.submit(run, "malshare", md5_hint(vt_api) or h)
+        if vt_api is not None and "vt_html" in todo and mode != "always":
+            if wants_scrape(mode, vt_api):
+                futs["vt_html"] = ex.submit(run, "vt_html", h)
+            elif "vt_api" not in res.failed + res.skipped:
+                local["vt_html"] = {"permalink": permalink(h)}
+            else:  # decide again once the API answers
+                res.raw["vt_html"] = {"permalink": permalink(h)}
+    done, _ = wait(futs.values(), timeout=left())
+    fetched = {k: f.result() for k, f in futs.items() if f in done}
+    fetched.update(local)
+    for k, f in futs.items():
+        if f not in done:
+            res.late.append(k)
+            f.add_done_callback(lambda f, k=k: _fill_in(cfg, h, k, f, res))
+
+    if "vt_api" in fetched:
+        fetched["vt_api"] = compact_vt(fetched["vt_api"])
+    res.raw.update(fetched)
+    res.fetched = list(fetched)
+    with profiling.stage("cache"):
+        save_raw(cfg, h, stored(res))
+    return res
+
+def stored(res: SourceResults) -> Dict[str, Dict[str, Any]]:
+    """The responses query_sources fetched and wrote to the raw cache."""
+    missing = set(res.failed) | set(res.skipped)
+    return {k: res.raw[k] for k in res.fetched if k not in missing and _cacheable(res.raw[k])}
+
+def unavailable(res: SourceResults) -> str:
+    """Report flag for sources with no answer this time: failed, skipped by their breaker, or late."""
+    return ";".join(k for k in SOURCE_KEYS if k in res.failed or k in res.skipped or k in res.late)
+
+def sample_digests(raw: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """md5/sha1/sha256 of the sample as reported by VT, MalwareBazaar or CIRCL hashlookup."""
+    out: Dict[str, str] = {}
+    def take(kind: str, value: Any) -> None:
+        if isinstance(value, str) and value and kind not in out:
+            out[kind] = value.lower()
+    attrs = ((raw.get("vt_api") or {}).get("data") or {}).get("attributes") or {}
+    for kind in ("md5", "sha1", "sha256"):
+        take(kind, attrs.get(kind))
+    mb = raw.get("malwarebazaar") or {}
+    if mb.get("query_status") == "ok" and isinstance(mb.get("data"), list) and mb["data"]:
+        row = mb["data"][0]
+        for kind in ("md5", "sha1", "sha256"):
+            take(kind, row.get(f"{kind}_hash"))
+    hl = raw.get("hashlookup") or {}
+    for kind, key in (("md5", "MD5"), ("sha1", "SHA-1"), ("sha256", "SHA-256")):
+        take(kind, hl.get(key))
+    return out
+
+def probe_cache(cfg: AppConfig, hashes: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Raw responses for the hashes whose every enabled source is fresh in the cache."""
+    need = [k for k in SOURCE_KEYS if getattr(cfg, service_of(k)).enabled]
+    with profiling.stage("cache"):
+        hits = {h: {**empty_sources(), **raw} for h, raw in load_raw_many(cfg, hashes).items()
+                if all(k in raw for k in need)}
+    # Partial hits are counted per source by query_sources when the hash is looked up.
+    for k in need:
+        metrics.inc("cache_hits", len(hits), source=k)
+    return hits
+
+def prefetch_bulk(cfg: AppConfig, logger, hashes: List[str]) -> int:
+    """
+    Warm the raw cache through the sources' bulk endpoints, so the per-hash
+    lookups that follow skip those sources. Returns the number of answers stored.
+    """
+    with profiling.stage("bulk_prefetch"):
+        return _prefetch_bulk(cfg, logger, hashes)
+
+def _prefetch_bulk(cfg: AppConfig, logger, hashes: List[str]) -> int:
+    bulk = [(k, m.query_many) for k, m in SOURCE_MODULES.items()
+            if hasattr(m, "query_many") and getattr(cfg, k).enabled and breaker_for(cfg, k).state == "closed"]
+    if not bulk or not hashes:
+        return 0
+    fresh = load_raw_many(cfg, hashes)
+    only = {h: knowngood.sources_for(cfg, h) for h in hashes}
+    n = 0
+    for key, query_many in bulk:
+        todo = [h for h in hashes if key not in fresh.get(h.lower(), {}) and (only[h] is None or key in only[h])]
+        if not todo:
+            continue
+        answers = {h: p for h, p in query_many(cfg, logger, todo).items() if _cacheable(p)}
+        save_raw_many(cfg, key, answers)
+        logger.info("Bulk %s: %d of %d hashes answered", key, len(answers), len(todo))
+        n += len(answers)
+    return n
+
+def merge_sources(h: str, comment: str, policy: MergePolicy, raw: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    with profiling.stage("merge"):
+        return merge_results(h, comment, policy, *(raw.get(k) or {} for k in SOURCE_KEYS))
+
+def lookup_hash(cfg: AppConfig, logger, vt: VirusTotalClient, h: str, comment: str,
+                vendor_allowlist: List[str], deadline_s: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Query (or reuse cached raw responses for) one hash and merge them into a report row.
+    Any digest of an already-seen sample resolves to its sha256 through the alias index.
+    ``deadline_s`` defaults to timeouts.deadline_s; sources that miss it are flagged in
+    unavailable_sources and filled into the cache for the next lookup.
+    """
+    with profiling.stage("lookup"):
+        return _lookup_hash(cfg, logger, vt, h, comment, vendor_allowlist, deadline_s)
+
+def _lookup_hash(cfg: AppConfig, logger, vt: VirusTotalClient, h: str, comment: str,
+                 vendor_allowlist: List[str], deadline_s: Optional[float]) -> Dict[str, Any]:
+    canon = resolve_alias(cfg, h) or h
+    legacy = load_from_cache(cfg, h)
+    if legacy is not None and not load_raw(cfg, canon):
+        logger.info("Cache hit for %s (migrated entry)", h)
+        return {**legacy, "hash": h, "comment": comment or ""}
+    only = knowngood.sources_for(cfg, h)
+    if only is not None:
+        metrics.inc("known_good_lookups", mode=cfg.known_good.mode)
+    res = query_sources(cfg, logger, vt, canon, cfg.timeouts.deadline_s if deadline_s is None else deadline_s, only)
+    if not res.fetched and not res.late:
+        logger.info("Cache hit for %s", h)
+    digests = sample_digests(res.raw)
+    sha256 = digests.get("sha256")
+    if sha256 and res.fetched:
+        save_aliases(cfg, digests.values(), sha256)
+        if sha256 != canon:
+            # First seen by md5/sha1: file the answers under the sha256 as well.
+            save_raw(cfg, sha256, {k: v for k, v in stored(res).items() if k in DIGEST_AGNOSTIC})
+    policy = policy_for(cfg, vendor_allowlist)
+    result = merge_sources(h, comment, policy, res.raw)
+    if policy.wants("unavailable_sources"):
+        result["unavailable_sources"] = unavailable(res)
+    return result
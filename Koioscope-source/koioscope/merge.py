@@ -1,5 +1,89 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Tuple
+import fnmatch, re, threading
+from functools import partial
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+from .config import AppConfig
+from .knowngood import KNOWN_GOOD_TAG, is_known
+from .report import REPORT_COLUMNS
+
+class MergePolicy:
+    """
+    What merge_results keeps from a row, worked out once per run instead of
+    per row. ``vendor_allowlist`` entries match VT engine names
+    case-insensitively and may be globs ("TrendMicro*") or names from
+    ``vendor_aliases`` (alias -> engine names or globs); an empty allowlist
+    keeps every engine. ``columns`` limits which report columns are filled
+    (the hash always is); the rest are left out and come out empty. Hashes
+    ``known_good`` accepts are tagged KnownGood. With ``exact`` the allowlist
+    holds plain, case-sensitive engine names, as merge_results takes a list.
+    """
+    def __init__(self, vendor_allowlist: Iterable[str] = (), vendor_aliases: Optional[Dict[str, Sequence[str]]] = None,
+                 columns: Optional[Sequence[str]] = None, known_good: Optional[Callable[[str], bool]] = None,
+                 exact: bool = False):
+        aliases = {k.casefold(): list(v) for k, v in (vendor_aliases or {}).items()}
+        names, globs = set(), []
+        for entry in vendor_allowlist:
+            if exact:
+                names.add(entry)
+                continue
+            for pat in aliases.get(entry.casefold(), [entry]):
+                if any(ch in pat for ch in "*?["):
+                    globs.append(fnmatch.translate(pat.casefold()))
+                else:
+                    names.add(pat.casefold())
+        self.filter_vendors = bool(names or globs)
+        self._names: FrozenSet[str] = frozenset(names)
+        self._glob = re.compile("|".join(globs)) if globs else None
+        self._fold = not exact
+        self._verdicts: Dict[str, bool] = {}  # engine name -> kept; VT has ~70 engines
+
+        unknown = [c for c in columns or () if c not in REPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"report_columns: unknown column(s) {', '.join(unknown)}")
+        self.columns: FrozenSet[str] = frozenset(columns or REPORT_COLUMNS) | {"hash"}
+        self.all_columns = self.columns >= set(REPORT_COLUMNS)
+        self.known_good = known_good
+
+    def keeps_vendor(self, name: str) -> bool:
+        kept = self._verdicts.get(name)
+        if kept is None:
+            key = name.casefold() if self._fold else name
+            kept = key in self._names or bool(self._glob and self._glob.match(key))
+            self._verdicts[name] = kept
+        return kept
+
+    def vendors(self, results: Dict[str, str]) -> Dict[str, str]:
+        if not self.filter_vendors:
+            return results
+        return {k: v for k, v in results.items() if self.keeps_vendor(k)}
+
+    def wants(self, column: str) -> bool:
+        return column in self.columns
+
+_policies: Dict[Tuple[Any, ...], MergePolicy] = {}
+_policies_lock = threading.Lock()
+
+def policy_for(cfg: AppConfig, vendor_allowlist: Optional[List[str]] = None) -> MergePolicy:
+    """The compiled policy for ``cfg`` (and an allowlist overriding cfg.vendor_allowlist), built once."""
+    vendors = tuple(cfg.vendor_allowlist if vendor_allowlist is None else vendor_allowlist)
+    kg = cfg.known_good
+    key = (vendors, tuple((k, tuple(v)) for k, v in sorted(cfg.vendor_aliases.items())), tuple(cfg.report_columns),
+           kg.bloom_path, kg.uppercase)
+    with _policies_lock:
+        policy = _policies.get(key)
+        if policy is None:
+            policy = _policies[key] = MergePolicy(vendors, cfg.vendor_aliases, cfg.report_columns or None,
+                                                  partial(is_known, cfg) if kg.bloom_path else None)
+        return policy
+
+def indicator_tags(filenames: List[str], vt_detection_ratio: str) -> List[str]:
+    """Heuristic tags: Microsoft-named files, and samples no engine flags."""
+    tags = []
+    if any("Microsoft" in fn for fn in filenames):
+        tags.append("MSSoftware")
+    if vt_detection_ratio.startswith("0/"):
+        tags.append("Harmless")
+    return tags
 
 def _vt_extract(api: Dict[str, Any]) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
@@ -58,14 +142,19 @@ def _collect_source_links(h: str, vt_permalink: str, extra_links: List[str]) ->
     links.extend([x for x in extra_links if x])
     return list(dict.fromkeys(links))
 
-def merge_results(file_hash: str, comment: str, vendor_allowlist: List[str], vt_api: Dict[str, Any], vt_html: Dict[str, Any],
+def merge_results(file_hash: str, comment: str, policy: Union[MergePolicy, List[str]], vt_api: Dict[str, Any], vt_html: Dict[str, Any],
                   urlhaus: Dict[str, Any], mb: Dict[str, Any], malshare: Dict[str, Any], hybrid: Dict[str, Any], hashlookup: Dict[str, Any], otx: Dict[str, Any], threatfox: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One report row from every source's raw response. ``policy`` comes from
+    policy_for; a plain list of exact engine names is still accepted but is
+    compiled on every call.
+    """
+    if not isinstance(policy, MergePolicy):
+        policy = MergePolicy(policy, exact=True)
     vt = _vt_extract(vt_api)
     vt_permalink = (vt_html or {}).get("permalink","")
 
-    vendors = vt.get("vendors", {})
-    if vendor_allowlist:
-        vendors = {k:v for k,v in vendors.items() if k in set(vendor_allowlist)}
+    vendors = policy.vendors(vt.get("vendors", {})) if policy.wants("av_vendor_matches") else {}
 
     filenames = vt.get("filenames", [])
 
@@ -157,13 +246,9 @@ def merge_results(file_hash: str, comment: str, vendor_allowlist: List[str], vt_
         extra_links.append("https://threatfox.abuse.ch/")
         tags.add("ThreatFox")
 
-    # Indicator tags heuristic
-    indicator_tags = []
-    if "Microsoft" in " ".join(filenames):
-        indicator_tags.append("MSSoftware")
-    if vt.get("vt_detection_ratio"):
-        if vt.get("vt_detection_ratio").startswith("0/"):
-            indicator_tags.append("Harmless")
+    heuristic = indicator_tags(filenames, vt.get("vt_detection_ratio") or "")
+    if policy.known_good is not None and policy.known_good(file_hash):
+        heuristic.append(KNOWN_GOOD_TAG)
 
     result = {
         "hash": file_hash,
@@ -177,7 +262,9 @@ def merge_results(file_hash: str, comment: str, vendor_allowlist: List[str], vt_
         "vt_detection_ratio": vt.get("vt_detection_ratio",""),
         "first_seen": first_seen or "",
         "last_seen": last_seen or "",
-        "indicator_tags": ";".join(sorted(set(indicator_tags) | tags)) if (indicator_tags or tags) else "",
+        "indicator_tags": ";".join(sorted(tags.union(heuristic))) if (heuristic or tags) else "",
         "source_links": ";".join(_collect_source_links(file_hash, vt_permalink, extra_links)),
     }
+    if not policy.all_columns:
+        result = {k: v for k, v in result.items() if k in policy.columns}
     return result
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import json, os, threading, time
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from .config import AppConfig
+
+# Upper bounds (seconds) of the request latency histogram buckets; the last bucket is +Inf.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Counters, with their Prometheus help text. ``service`` labels are the
+# http_pool endpoint names ("virustotal", "virustotal/web", "hashlookup/bulk"),
+# ``source`` labels the raw-response keys (vt_api, vt_html, urlhaus, ...).
+COUNTERS = {
+    "requests": "HTTP requests by service and response status (error = no response)",
+    "retries": "Attempts repeated after a failure or a 429",
+    "retries_denied": "Retries refused because the retry budget was spent",
+    "throttle_wait_seconds": "Time callers waited on the client-side rate limiter",
+    "cache_hits": "Source answers served from the raw-response cache",
+    "cache_misses": "Source answers that had to be fetched",
+    "known_good_lookups": "Lookups cut down because the hash is in the known-good bloom filter",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile (the last finite bound for +Inf)."""
+        if not self.count:
+            return None
+        seen = 0
+        for bound, n in zip(self.bounds + (self.bounds[-1],), self.counts):
+            seen += n
+            if seen >= q * self.count:
+                return bound
+        return self.bounds[-1]
+
+class Metrics:
+    """Thread-safe counters and latency histograms for one process."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters: Dict[Tuple[str, Labels], float] = {}
+            self.latency: Dict[str, Histogram] = {}
+            self.started = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, service: str, seconds: float) -> None:
+        with self._lock:
+            h = self.latency.get(service)
+            if h is None:
+                h = self.latency[service] = Histogram()
+            h.observe(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-service request/latency/retry/throttle figures, per-source cache hit ratios and known-good cut-downs."""
+        services: Dict[str, Dict[str, Any]] = {}
+        cache: Dict[str, Dict[str, Any]] = {}
+        known_good: Dict[str, int] = {}
+        with self._lock:
+            counters = dict(self.counters)
+            latency = {k: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                       for k, h in self.latency.items()}
+        def svc(name: str) -> Dict[str, Any]:
+            return services.setdefault(name, {
+                "requests": 0, "status": {}, "errors": 0, "throttled": 0, "retries": 0,
+                "retries_denied": 0, "throttle_wait_s": 0.0})
+        for (name, labels), value in sorted(counters.items()):
+            lab = dict(labels)
+            if name in ("cache_hits", "cache_misses"):
+                c = cache.setdefault(lab.get("source", ""), {"hits": 0, "misses": 0})
+                c["hits" if name == "cache_hits" else "misses"] += int(value)
+                continue
+            if name == "known_good_lookups":
+                known_good[lab.get("mode", "")] = int(value)
+                continue
+            s = svc(lab.get("service", ""))
+            if name == "requests":
+                status = lab.get("status", "")
+                s["requests"] += int(value)
+                s["status"][status] = int(value)
+                if status == "429":
+                    s["throttled"] += int(value)
+                elif status == "error" or status.startswith("5"):
+                    s["errors"] += int(value)
+            elif name == "throttle_wait_seconds":
+                s["throttle_wait_s"] = round(value, 3)
+            else:
+                s[name] += int(value)
+        for name, (count, total, p50, p95, p99) in latency.items():
+            svc(name)["latency_s"] = {"count": count, "mean": round(total / count, 4) if count else None,
+                                      "p50": p50, "p95": p95, "p99": p99}
+        for c in cache.values():
+            asked = c["hits"] + c["misses"]
+            c["hit_ratio"] = round(c["hits"] / asked, 4) if asked else None
+        out: Dict[str, Any] = {"services": services, "cache": cache}
+        if known_good:
+            out["known_good_lookups"] = known_good
+        return out
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self.counters)
+            hists = {k: (list(h.counts), h.sum, h.count) for k, h in self.latency.items()}
+        lines: List[str] = []
+        for name, help_text in COUNTERS.items():
+            rows = sorted((labels, v) for (n, labels), v in counters.items() if n == name)
+            if not rows:
+                continue
+            metric = f"koioscope_{name}_total"
+            lines += [f"# HELP {metric} {help_text}.", f"# TYPE {metric} counter"]
+            lines += [f"{metric}{_labels(labels)} {_num(v)}" for labels, v in rows]
+        if hists:
+            metric = "koioscope_request_duration_seconds"
+            lines += [f"# HELP {metric} HTTP request latency by service.", f"# TYPE {metric} histogram"]
+            for service, (counts, total, count) in sorted(hists.items()):
+                cumulative = 0
+                for bound, n in zip([*map(_num, LATENCY_BUCKETS), "+Inf"], counts):
+                    cumulative += n
+                    lines.append(f"{metric}_bucket{_labels((('le', bound), ('service', service)))} {cumulative}")
+                lines.append(f"{metric}_sum{_labels((('service', service),))} {_num(total)}")
+                lines.append(f"{metric}_count{_labels((('service', service),))} {count}")
+        lines += ["# HELP koioscope_last_run_timestamp_seconds When these metrics were written.",
+                  "# TYPE koioscope_last_run_timestamp_seconds gauge",
+                  f"koioscope_last_run_timestamp_seconds {_num(round(time.time(), 3))}"]
+        return "\n".join(lines) + "\n"
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+# The process-wide registry every module records into.
+REGISTRY = Metrics()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+reset = REGISTRY.reset
+
+def write_summary(path: str, **extra: Any) -> Dict[str, Any]:
+    """Append one JSON line summarising this process's metrics (plus ``extra`` run fields) to ``path``."""
+    now = time.time()
+    record = {"ts": datetime.fromtimestamp(now, timezone.utc).isoformat().replace("+00:00", "Z"),
+              "elapsed_s": round(now - REGISTRY.started, 3), **extra, **REGISTRY.summary()}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return record
+
+def write_textfile(path: str) -> None:
+    """Write the Prometheus textfile atomically, as node_exporter's textfile collector requires."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.prometheus())
+    os.replace(tmp, path)
+
+def emit(cfg: AppConfig, logger=None, **extra: Any) -> None:
+    """Write the configured run summary and textfile; with ``logger``, also log one line per service."""
+    m = cfg.metrics
+    try:
+        if m.summary_path:
+            record = write_summary(m.summary_path, **extra)
+        else:
+            record = REGISTRY.summary()
+        if m.textfile_path:
+            write_textfile(m.textfile_path)
+    except OSError as e:
+        if logger:
+            logger.warning("Could not write metrics: %s", e)
+        return
+    if logger:
+        for line in describe(record):
+            logger.info("%s", line)
+
+def describe(summary: Dict[str, Any]) -> List[str]:
+    """Human-readable one-liners for a summary, for the end-of-run log."""
+    lines = []
+    for name, s in sorted(summary.get("services", {}).items()):
+        lat = s.get("latency_s") or {}
+        lines.append(f"{name}: {s['requests']} requests, p50 {lat.get('p50')}s, p99 {lat.get('p99')}s, "
+                     f"{s['errors']} errors, {s['throttled']} throttled, {s['retries']} retries, "
+                     f"{s['throttle_wait_s']:.1f}s rate-limit wait")
+    cache = summary.get("cache", {})
+    hits = sum(c["hits"] for c in cache.values())
+    asked = hits + sum(c["misses"] for c in cache.values())
+    if asked:
+        lines.append(f"cache: {hits}/{asked} source answers from cache ({100 * hits / asked:.0f}%)")
+    for mode, n in sorted(summary.get("known_good_lookups", {}).items()):
+        lines.append(f"known-good: {n} lookups cut down (mode {mode})")
+    return lines
@@ -0,0 +1,167 @@
+from __future__ import annotations
+import os, sys, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Pipeline stages timed by --profile, in pipeline order. "lookup" is one whole
+# per-hash lookup; the cache, throttle, network, scrape_parse and merge time
+# spent inside it is also counted under those stages.
+STAGES = ("ingest", "cache", "bulk_prefetch", "lookup", "throttle", "network", "scrape_parse",
+          "merge", "journal", "report")
+
+_IDLE_WORKER = os.path.join("concurrent", "futures", "thread.py")
+
+_enabled = False
+_lock = threading.Lock()
+_stats: Dict[str, List[float]] = {}  # stage -> [calls, total seconds, max seconds]
+_started = 0.0
+
+def enable() -> None:
+    global _enabled, _started
+    with _lock:
+        _stats.clear()
+        _started = time.perf_counter()
+        _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def enabled() -> bool:
+    return _enabled
+
+def record(name: str, seconds: float) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        s = _stats.get(name)
+        if s is None:
+            _stats[name] = [1, seconds, seconds]
+        else:
+            s[0] += 1
+            s[1] += seconds
+            s[2] = max(s[2], seconds)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as one call of ``name`` (a no-op unless profiling is on)."""
+    if not _enabled:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+def timed_iter(name: str, items: Iterable[T]) -> Iterator[T]:
+    """Yield from ``items``, charging the time spent producing each one to ``name``."""
+    it = iter(items)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            record(name, time.perf_counter() - t0)
+            return
+        record(name, time.perf_counter() - t0)
+        yield item
+
+def summary(rows: int = 0) -> Dict[str, Any]:
+    """Per-stage calls, total/mean/max seconds and, given ``rows``, milliseconds per input row."""
+    with _lock:
+        stats = {k: list(v) for k, v in _stats.items()}
+        wall = time.perf_counter() - _started if _started else 0.0
+    stages = {}
+    for name in [*STAGES, *sorted(set(stats) - set(STAGES))]:
+        if name not in stats:
+            continue
+        calls, total, worst = stats[name]
+        stages[name] = {"calls": int(calls), "total_s": round(total, 4), "mean_ms": round(1000 * total / calls, 3),
+                        "max_ms": round(1000 * worst, 3),
+                        "per_row_ms": round(1000 * total / rows, 3) if rows else None}
+    return {"wall_s": round(wall, 3), "rows": rows, "stages": stages}
+
+def describe(s: Dict[str, Any]) -> List[str]:
+    """The stage breakdown as a table, for the end-of-run log."""
+    lines = [f"Profile: {s['rows']} rows in {s['wall_s']:.2f}s wall "
+             f"(stage times are summed over threads, so they can exceed the wall time)",
+             f"  {'stage':14} {'calls':>8} {'total s':>10} {'mean ms':>10} {'max ms':>10} {'ms/row':>9}"]
+    for name, st in s["stages"].items():
+        per_row = "" if st["per_row_ms"] is None else f"{st['per_row_ms']:.2f}"
+        lines.append(f"  {name:14} {st['calls']:8d} {st['total_s']:10.3f} {st['mean_ms']:10.2f} "
+                     f"{st['max_ms']:10.1f} {per_row:>9}")
+    return lines
+
+class RunProfiler:
+    """
+    Whole-run profile of every thread. A ``.prof``/``.pstats`` path gets a
+    cProfile dump (one profiler per thread, merged; open with pstats or
+    snakeviz); any other path gets sampled stacks in the folded format that
+    flamegraph.pl and speedscope read, one sample every ``interval_s``.
+    Only threads started after ``start()`` are covered by the cProfile mode.
+    """
+    def __init__(self, path: str, interval_s: float = 0.005):
+        self.path = path
+        self.interval_s = interval_s
+        self.cprofile = path.lower().endswith((".prof", ".pstats"))
+        self._profiles: List[Any] = []
+        self._samples: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "RunProfiler":
+        if self.cprofile:
+            import cProfile
+            def install(*_args) -> None:
+                # First profile event in a new thread: hand it over to its own cProfile.
+                prof = cProfile.Profile()
+                with _lock:
+                    self._profiles.append(prof)
+                prof.enable()
+            if sys.version_info < (3, 12):
+                threading.setprofile(install)
+            # From 3.12 cProfile sits on sys.monitoring: one profiler sees every thread.
+            install()
+        else:
+            self._thread = threading.Thread(target=self._sample, name="koioscope-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if frame.f_code.co_name == "_worker" and frame.f_code.co_filename.endswith(_IDLE_WORKER):
+                    continue  # an idle executor thread waiting for work
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self._samples[key] = self._samples.get(key, 0) + 1
+
+    def stop(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.cprofile:
+            import pstats
+            threading.setprofile(None)
+            with _lock:
+                profiles = list(self._profiles)
+            for prof in profiles:
+                prof.disable()
+            stats = pstats.Stats(*profiles) if profiles else None
+            if stats is not None:
+                stats.dump_stats(self.path)
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with open(self.path, "w", encoding="utf-8") as f:
+            for key, n in sorted(self._samples.items()):
+                f.write(f"{key} {n}\n")
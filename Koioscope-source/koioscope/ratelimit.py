@@ -0,0 +1,181 @@
+from __future__ import annotations
+import threading, time
+from typing import Any, Dict, Optional
+from .config import AppConfig
+from . import metrics, profiling
+
+# Probing ceiling, as a multiple of the configured rate, when max_requests_per_minute is unset.
+DEFAULT_HEADROOM = 2.0
+
+def ceiling(rpm: float, max_rpm: float = 0) -> float:
+    """The rate a limiter may probe up to: ``max_rpm``, or DEFAULT_HEADROOM x ``rpm`` when unset."""
+    return max(float(rpm), float(max_rpm) if max_rpm else DEFAULT_HEADROOM * rpm)
+
+class RateLimited(RuntimeError):
+    """HTTP 429 from a service; ``retry_after`` is the server's requested pause in seconds, if any."""
+    def __init__(self, service: str, retry_after: Optional[float] = None):
+        hint = f", retry after {retry_after:.0f}s" if retry_after else ""
+        super().__init__(f"{service or 'service'} HTTP 429{hint}")
+        self.service = service
+        self.retry_after = retry_after
+
+def retry_after(resp: Any) -> Optional[float]:
+    """Seconds from a Retry-After header (delta or HTTP date), or until an exhausted X-RateLimit quota resets."""
+    headers = getattr(resp, "headers", None) or {}
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    if str(headers.get("X-RateLimit-Remaining", "")).strip() == "0":
+        try:
+            reset = float(headers.get("X-RateLimit-Reset", ""))
+        except ValueError:
+            return None
+        # Either an epoch timestamp or a number of seconds, depending on the provider.
+        return max(0.0, reset - time.time()) if reset > 1e9 else reset
+    return None
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at ``rpm`` tokens/minute up to ``burst``.
+    Callers reserve a token under the lock and sleep outside it, so waiters
+    queue up fairly without holding the lock.
+
+    The rate adapts to what the service says (AIMD): a 429 halves it and a
+    Retry-After pauses the bucket; while requests keep succeeding it climbs
+    back by a tenth of the configured rate per probe interval, up to
+    ``max_rpm`` (twice the configured rate when unset; set it to ``rpm`` to
+    never go above the configured rate).
+    """
+    def __init__(self, rpm: float, burst: int = 1, max_rpm: float = 0, name: str = ""):
+        self._lock = threading.Lock()
+        self.name = name
+        self.configure(rpm, burst, max_rpm)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+
+    def configure(self, rpm: float, burst: int = 1, max_rpm: float = 0) -> None:
+        with self._lock:
+            self.base_rpm = max(1e-6, float(rpm))
+            self.rpm = self.base_rpm
+            self.burst = max(1, int(burst))
+            self.max_rpm = ceiling(self.base_rpm, max_rpm)
+            self.min_rpm = self.base_rpm / 10
+            self._changed = self._throttled = float("-inf")
+
+    @property
+    def rate(self) -> float:
+        return self.rpm / 60.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self) -> float:
+        """Take one token; returns how long the caller must wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is free right now (for optional extra requests)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self) -> float:
+        delay = self.reserve()
+        if delay > 0:
+            metrics.inc("throttle_wait_seconds", delay, service=self.name)
+            profiling.record("throttle", delay)
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self) -> float:
+        delay = self.reserve()
+        if delay > 0:
+            metrics.inc("throttle_wait_seconds", delay, service=self.name)
+            profiling.record("throttle", delay)
+            import asyncio
+            await asyncio.sleep(delay)
+        return delay
+
+    def _interval(self) -> float:
+        return 60.0 / self.rpm
+
+    def on_success(self) -> None:
+        """Additive increase, at most once per probe interval (two requests at the current rate, >= 10s)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rpm >= self.max_rpm or now - self._changed < max(10.0, 2 * self._interval()):
+                return
+            self._refill(now)
+            self.rpm = min(self.max_rpm, self.rpm + self.base_rpm / 10)
+            self._changed = now
+
+    def on_throttle(self, wait: Optional[float] = None) -> None:
+        """
+        Multiplicative decrease, once per congestion event (429s from requests
+        already in flight don't count again), and a pause of ``wait`` seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now - self._throttled >= self._interval():
+                self.rpm = max(self.min_rpm, self.rpm / 2)
+                self._throttled = self._changed = now
+        if wait:
+            self.pause(wait)
+
+    def pause(self, wait: float) -> None:
+        """Hold every caller back for ``wait`` seconds without changing the rate."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # Token debt: the next reservation lands ``wait`` seconds from now.
+            self._tokens = min(self._tokens, 0.0) - wait * self.rate
+
+    def observe(self, resp: Any) -> None:
+        """Feed one HTTP response back into the rate; raises RateLimited on a 429."""
+        if resp.status_code == 429:
+            wait = retry_after(resp)
+            self.on_throttle(wait)
+            raise RateLimited(self.name, wait)
+        if resp.status_code < 500:
+            self.on_success()
+            wait = retry_after(resp)  # quota used up on a successful response
+            if wait:
+                self.pause(wait)
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(service: str, rpm: float, burst: int = 1, max_rpm: float = 0) -> TokenBucket:
+    """
+    Process-wide limiter for ``service``, shared by every lookup thread; reconfigured
+    in place (and its adapted rate reset) only if the configured quota changes.
+    """
+    with _limiters_lock:
+        lim = _limiters.get(service)
+        if lim is None:
+            lim = _limiters[service] = TokenBucket(rpm, burst, max_rpm, name=service)
+        elif (lim.base_rpm, lim.burst, lim.max_rpm) != (rpm, burst, ceiling(rpm, max_rpm)):
+            lim.configure(rpm, burst, max_rpm)
+        return lim
+
+def limiter_for(cfg: AppConfig, service: str) -> TokenBucket:
+    rl = getattr(cfg, service).rate_limit
+    return get_limiter(service, rl.requests_per_minute, rl.burst, rl.max_requests_per_minute)
+
+def reset_limiters() -> None:
+    with _limiters_lock:
+        _limiters.clear()
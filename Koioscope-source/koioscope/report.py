@@ -1,7 +1,7 @@
 from __future__ import annotations
-from typing import Any, Dict, Iterable, List
-import pandas as pd
-import os
+from array import array
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import csv, json, os, threading, time
 
 REPORT_COLUMNS = [
     "hash", "comment",
@@ -13,12 +13,215 @@ REPORT_COLUMNS = [
     "first_seen", "last_seen",
     "indicator_tags",
     "source_links",
+    "unavailable_sources",  # sources that failed or were skipped for this row
 ]
 
+def is_streaming(out_path: str) -> bool:
+    """CSV and JSONL reports are appended row by row; XLSX is written in one go."""
+    return not out_path.lower().endswith(".xlsx")
+
+def _cell(v: Any) -> Any:
+    return "" if v is None else v
+
+class ReportWriter:
+    """
+    Append report rows to a CSV or JSONL file as they arrive. Rows are flushed
+    immediately and fsync'ed every ``fsync_rows`` rows or ``fsync_s`` seconds,
+    so a crash loses at most that much; nothing is kept in memory.
+    """
+
+    def __init__(self, out_path: str, fsync_rows: int = 100, fsync_s: float = 5.0):
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        self.path = out_path
+        self.jsonl = out_path.lower().endswith(".jsonl")
+        self.fsync_rows = fsync_rows
+        self.fsync_s = fsync_s
+        self.rows = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._f: IO[str] = open(out_path, "w", encoding="utf-8", newline="")
+        self._csv = None
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._f, REPORT_COLUMNS, restval="", extrasaction="ignore",
+                                       lineterminator="\n")
+            self._csv.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._csv is not None:
+            self._csv.writerow({k: _cell(v) for k, v in row.items()})
+        else:
+            self._f.write(json.dumps({c: _cell(row.get(c)) for c in REPORT_COLUMNS}, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self.rows += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_rows or time.monotonic() - self._last_sync >= self.fsync_s:
+            self.sync()
+
+    def sync(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self.sync()
+            self._f.close()
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class OrderedRows:
+    """
+    Put rows that complete out of order back into input order before writing.
+    At most ``window`` rows wait for a slow predecessor; past that the oldest
+    waiting row is written anyway, so memory stays bounded.
+    """
+
+    def __init__(self, writer: ReportWriter, window: int = 5000):
+        self.writer = writer
+        self.window = window
+        self.next = 0
+        self._held: Dict[int, Dict[str, Any]] = {}
+
+    def add(self, index: int, row: Dict[str, Any]) -> None:
+        if index < self.next:  # its slot was given up; write it where it lands
+            self.writer.write(row)
+            return
+        self._held[index] = row
+        if len(self._held) > self.window:
+            self.next = min(self._held)
+        self._release()
+
+    def _release(self) -> None:
+        while self.next in self._held:
+            self.writer.write(self._held.pop(self.next))
+            self.next += 1
+
+    def flush(self) -> None:
+        for i in sorted(self._held):
+            self.writer.write(self._held.pop(i))
+
+HASH_MARK = "\x00"  # stands for the row's own hash inside a stored value
+
+class ResultStore:
+    """
+    Report rows held column-wise, for the GUI and XLSX reports of large batches.
+    Every column but ``hash`` is dictionary-encoded: an array of 4-byte codes
+    into the column's distinct values, so a vendor string, tag list or comment
+    repeated over many rows is stored once. The row's own hash is factored out
+    of values first (VT/MalwareBazaar links embed it), so those repeat too.
+    Rows read back as plain dicts over ``columns``; appends are thread-safe.
+    Rows are kept in arrival order; each also has a sort key (by default
+    after every earlier row) and reports are written in key order.
+    """
+
+    def __init__(self, columns: Sequence[str] = REPORT_COLUMNS):
+        self.columns = tuple(columns)
+        self._lock = threading.Lock()
+        self.clear()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "ResultStore":
+        store = cls()
+        for r in rows:
+            store.append(r)
+        return store
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hashes: List[str] = []
+            self._keys = array("I")
+            self.next_key = 0  # default key of the next row
+            encoded = [c for c in self.columns if c != "hash"]
+            self._codes = {c: array("I") for c in encoded}
+            self._values: Dict[str, List[Any]] = {c: [] for c in encoded}
+            self._index: Dict[str, Dict[Any, int]] = {c: {} for c in encoded}
+
+    def append(self, row: Dict[str, Any], key: Optional[int] = None) -> int:
+        """
+        Store one row (columns it lacks are empty); returns its index. ``key``
+        places it in report order, e.g. next_key at batch start + input row index.
+        """
+        h = str(row.get("hash") or "")
+        with self._lock:
+            key = self.next_key if key is None else key
+            self._keys.append(key)
+            self.next_key = max(self.next_key, key + 1)
+            for c, codes in self._codes.items():
+                v = row.get(c)
+                if v is None:
+                    v = ""
+                elif not isinstance(v, (str, int, float, bool)):
+                    v = str(v)
+                if h and isinstance(v, str) and h in v:
+                    v = v.replace(h, HASH_MARK)
+                index = self._index[c]
+                code = index.get(v)
+                if code is None:
+                    code = index[v] = len(self._values[c])
+                    self._values[c].append(v)
+                codes.append(code)
+            self._hashes.append(h)
+            return len(self._hashes) - 1
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _get(self, i: int, col: str) -> Any:
+        h = self._hashes[i]
+        if col == "hash":
+            return h
+        v = self._values[col][self._codes[col][i]]
+        return v.replace(HASH_MARK, h) if isinstance(v, str) and HASH_MARK in v else v
+
+    def get(self, i: int, col: str) -> Any:
+        with self._lock:
+            return self._get(i, col)
+
+    def values(self, i: int, columns: Sequence[str]) -> Tuple[Any, ...]:
+        """One row's cells in ``columns`` order (what a table widget wants)."""
+        with self._lock:
+            return tuple(self._get(i, c) for c in columns)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        with self._lock:
+            if i < 0:
+                i += len(self._hashes)
+            return {c: self._get(i, c) for c in self.columns}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, col: str, order: Optional[Sequence[int]] = None) -> List[Any]:
+        with self._lock:
+            return [self._get(i, col) for i in (range(len(self._hashes)) if order is None else order)]
+
+    def in_order(self) -> List[int]:
+        """Row indices sorted by key: the order reports are written in."""
+        with self._lock:
+            keys = self._keys
+            return sorted(range(len(keys)), key=keys.__getitem__)
+
+    def distinct(self, col: str) -> int:
+        """Number of distinct stored values in ``col`` (rows, for the hash column)."""
+        return len(self._hashes) if col == "hash" else len(self._values[col])
+
 def write_report(rows: Iterable[Dict[str, Any]], out_path: str) -> None:
-    df = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+    """Write ``rows`` to CSV/JSONL/XLSX; a ResultStore is written in key order (see ResultStore.append)."""
+    order = rows.in_order() if isinstance(rows, ResultStore) else None
+    if is_streaming(out_path):
+        with ReportWriter(out_path) as w:
+            for r in (rows if order is None else (rows[i] for i in order)):
+                w.write(r)
+        return
+    import pandas as pd
+    # Built column by column from the compact store rather than from a list of row dicts.
+    store = rows if isinstance(rows, ResultStore) else ResultStore.from_rows(rows)
+    df = pd.DataFrame({c: store.column(c, order) for c in REPORT_COLUMNS}, columns=REPORT_COLUMNS)
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    if out_path.lower().endswith(".xlsx"):
-        df.to_excel(out_path, index=False)
-    else:
-        df.to_csv(out_path, index=False, encoding="utf-8")
+    df.to_excel(out_path, index=False)
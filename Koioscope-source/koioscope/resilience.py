@@ -0,0 +1,108 @@
+from __future__ import annotations
+import threading, time
+from typing import Dict, Optional
+from .config import AppConfig
+
+class CircuitBreaker:
+    """
+    Per-source breaker: after ``threshold`` consecutive failed lookups the
+    source is skipped for ``cooldown_s``; then one call is let through as a
+    probe (half-open) and its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, threshold: int = 5, cooldown_s: float = 60.0):
+        self._lock = threading.Lock()
+        self.threshold = max(1, threshold)
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.state = "closed"  # closed | open | half_open
+        self._opened = 0.0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened >= self.cooldown_s:
+                self.state = "half_open"  # this caller is the probe
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def failure(self) -> bool:
+        """Count a failed lookup; returns True when this failure opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state = "open"
+                self._opened = time.monotonic()
+                return True
+            return False
+
+    def remaining(self) -> float:
+        """Seconds left in the cool-down (0 unless open)."""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.cooldown_s - (time.monotonic() - self._opened))
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of traffic: every first attempt earns ``ratio``
+    of a retry, every retry spends one, and at most ``reserve`` can be saved up
+    (which is also the starting balance, so a quiet process can still retry).
+    """
+    def __init__(self, ratio: float = 0.2, reserve: int = 10):
+        self._lock = threading.Lock()
+        self.configure(ratio, reserve)
+        self._balance = float(self.reserve)
+
+    def configure(self, ratio: float, reserve: int) -> None:
+        with self._lock:
+            self.ratio = max(0.0, float(ratio))
+            self.reserve = max(0, int(reserve))
+
+    def on_request(self) -> None:
+        with self._lock:
+            self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_budget: Optional[RetryBudget] = None
+_lock = threading.Lock()
+
+def breaker_for(cfg: AppConfig, source: str) -> CircuitBreaker:
+    """Process-wide breaker for one source (raw-response key, so VT API and VT page trip separately)."""
+    r = cfg.resilience
+    with _lock:
+        br = _breakers.get(source)
+        if br is None:
+            br = _breakers[source] = CircuitBreaker(r.breaker_failures, r.breaker_cooldown_s)
+        else:
+            br.threshold, br.cooldown_s = max(1, r.breaker_failures), r.breaker_cooldown_s
+        return br
+
+def budget_for(cfg: AppConfig) -> RetryBudget:
+    """The process-wide retry budget shared by every source."""
+    global _budget
+    r = cfg.resilience
+    with _lock:
+        if _budget is None:
+            _budget = RetryBudget(r.retry_ratio, r.retry_reserve)
+        elif (_budget.ratio, _budget.reserve) != (r.retry_ratio, r.retry_reserve):
+            _budget.configure(r.retry_ratio, r.retry_reserve)
+        return _budget
+
+def reset() -> None:
+    global _budget
+    with _lock:
+        _breakers.clear()
+        _budget = None
@@ -1,17 +1,16 @@
 from __future__ import annotations
-import requests
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List
 from ..config import AppConfig
-from ..utils import Throttle, with_backoff, detect_hash_type
+from ..http_pool import request
+from ..ratelimit import limiter_for
+from ..resilience import budget_for
+from ..utils import with_backoff, detect_hash_type
 
 BASE = "https://hashlookup.circl.lu"
+BULK_LIMIT = 250  # hashes per /bulk request
 
-def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
-    if not cfg.hashlookup.enabled:
-        return {}
-    th = Throttle(cfg.hashlookup.rate_limit.requests_per_minute)
-    th.wait()
-
+def fetch(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    """CIRCL Hashlookup query for one hash; raises once retries are exhausted."""
     htype = detect_hash_type(h) or "sha256"
     if htype not in ("md5","sha1","sha256"):
         htype = "sha256"
@@ -19,15 +18,72 @@ def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
     headers = {"User-Agent": "HashIntelLookup/0.2"}
 
     def do():
-        resp = requests.get(url, headers=headers, timeout=20)
+        lim = limiter_for(cfg, "hashlookup")
+        lim.acquire()
+        resp = request(cfg, "hashlookup", "GET", url, headers=headers, limiter=lim)
+        lim.observe(resp)
         if resp.status_code >= 500:
             raise RuntimeError(f"Hashlookup HTTP {resp.status_code}")
         if resp.status_code == 404:
             return {"found": False}
         resp.raise_for_status()
         return resp.json()
+    return with_backoff(do, logger=logger, budget=budget_for(cfg), service="hashlookup")
+
+def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    if not cfg.hashlookup.enabled:
+        return {}
     try:
-        return with_backoff(do, logger=logger)
+        return fetch(cfg, logger, h)
     except Exception as e:  # noqa: BLE001
         logger.warning("Hashlookup query failed for %s: %s", h, e)
         return {}
+
+def _record_key(htype: str) -> str:
+    return {"md5": "MD5", "sha1": "SHA-1"}[htype]
+
+def fetch_many(cfg: AppConfig, logger, htype: str, hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """One /bulk/{md5,sha1} call; hashes without a record map to {"found": False}, like a 404."""
+    url = f"{BASE}/bulk/{htype}"
+    headers = {"User-Agent": "HashIntelLookup/0.2", "Accept": "application/json"}
+
+    def do():
+        lim = limiter_for(cfg, "hashlookup")
+        lim.acquire()
+        resp = request(cfg, "hashlookup/bulk", "POST", url, json={"hashes": hashes}, headers=headers,
+                       timeout=60, limiter=lim)
+        lim.observe(resp)
+        if resp.status_code >= 500:
+            raise RuntimeError(f"Hashlookup HTTP {resp.status_code}")
+        resp.raise_for_status()
+        return resp.json()
+    data = with_backoff(do, logger=logger, budget=budget_for(cfg), service="hashlookup/bulk")
+    out: Dict[str, Dict[str, Any]] = {h: {"found": False} for h in hashes}
+    key = _record_key(htype)
+    for rec in data if isinstance(data, list) else []:
+        digest = isinstance(rec, dict) and rec.get(key)
+        if isinstance(digest, str) and digest.lower() in out:
+            out[digest.lower()] = rec
+    return out
+
+def query_many(cfg: AppConfig, logger, hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Bulk lookup for md5/sha1 inputs (the bulk API has no sha256 endpoint).
+    Returns answers keyed by hash; hashes that failed or weren't eligible are absent.
+    """
+    if not cfg.hashlookup.enabled:
+        return {}
+    by_type: Dict[str, List[str]] = {"md5": [], "sha1": []}
+    for h in hashes:
+        htype = detect_hash_type(h)
+        if htype in by_type:
+            by_type[htype].append(h.lower())
+    out: Dict[str, Dict[str, Any]] = {}
+    for htype, todo in by_type.items():
+        for i in range(0, len(todo), BULK_LIMIT):
+            chunk = todo[i:i + BULK_LIMIT]
+            try:
+                out.update(fetch_many(cfg, logger, htype, chunk))
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Hashlookup bulk %s query failed for %d hashes: %s", htype, len(chunk), e)
+    return out
@@ -1,17 +1,15 @@
 from __future__ import annotations
-import requests
 from typing import Any, Dict
 from ..config import AppConfig
-from ..utils import Throttle, with_backoff
+from ..http_pool import request
+from ..ratelimit import limiter_for
+from ..resilience import budget_for
+from ..utils import with_backoff
 
 BASE = "https://www.hybrid-analysis.com/api/v2"
 
-def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
-    if not cfg.hybrid_analysis.enabled:
-        return {}
-    th = Throttle(cfg.hybrid_analysis.rate_limit.requests_per_minute)
-    th.wait()
-
+def fetch(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    """HybridAnalysis query for one hash; raises once retries are exhausted."""
     headers = {
         "User-Agent": "Falcon Sandbox",
         "api-key": cfg.hybrid_analysis.api_key or "",
@@ -19,16 +17,24 @@ def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
     }
 
     def do():
+        lim = limiter_for(cfg, "hybrid_analysis")
+        lim.acquire()
         url = f"{BASE}/search/hash"
-        resp = requests.get(url, params={"hash": h}, headers=headers, timeout=25)
+        resp = request(cfg, "hybrid_analysis", "GET", url, params={"hash": h}, headers=headers, default_timeout=25, limiter=lim)
+        lim.observe(resp)
         if resp.status_code >= 500:
             raise RuntimeError(f"HybridAnalysis HTTP {resp.status_code}")
         if resp.status_code in (401, 403):
             return {"error": "unauthorized"}
         resp.raise_for_status()
         return resp.json()
+    return with_backoff(do, logger=logger, budget=budget_for(cfg), service="hybrid_analysis")
+
+def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    if not cfg.hybrid_analysis.enabled:
+        return {}
     try:
-        return with_backoff(do, logger=logger)
+        return fetch(cfg, logger, h)
     except Exception as e:  # noqa: BLE001
         logger.warning("HybridAnalysis query failed for %s: %s", h, e)
         return {}
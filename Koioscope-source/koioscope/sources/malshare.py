@@ -1,22 +1,23 @@
 from __future__ import annotations
-import requests
 from typing import Any, Dict
 from ..config import AppConfig
-from ..utils import Throttle, with_backoff
+from ..http_pool import request
+from ..ratelimit import limiter_for
+from ..resilience import budget_for
+from ..utils import with_backoff
 
 API = "https://malshare.com/api.php"
 
-def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
-    if not cfg.malshare.enabled:
-        return {}
-    th = Throttle(cfg.malshare.rate_limit.requests_per_minute)
-    th.wait()
-
+def fetch(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    """MalShare query for one hash; raises once retries are exhausted."""
     params = {"api_key": cfg.malshare.api_key or "", "action": "details", "hash": h}
     headers = {"User-Agent": "HashIntelLookup/0.2"}
 
     def do():
-        resp = requests.get(API, params=params, headers=headers, timeout=20)
+        lim = limiter_for(cfg, "malshare")
+        lim.acquire()
+        resp = request(cfg, "malshare", "GET", API, params=params, headers=headers, limiter=lim)
+        lim.observe(resp)
         if resp.status_code >= 500:
             raise RuntimeError(f"MalShare HTTP {resp.status_code}")
         if resp.status_code == 403:
@@ -26,8 +27,13 @@ def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
             return resp.json()
         except Exception:
             return {"raw": resp.text}
+    return with_backoff(do, logger=logger, budget=budget_for(cfg), service="malshare")
+
+def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    if not cfg.malshare.enabled:
+        return {}
     try:
-        return with_backoff(do, logger=logger)
+        return fetch(cfg, logger, h)
     except Exception as e:  # noqa: BLE001
         logger.warning("MalShare query failed for %s: %s", h, e)
         return {}
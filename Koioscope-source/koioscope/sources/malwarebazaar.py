@@ -1,30 +1,37 @@
 from __future__ import annotations
-import requests
 from typing import Any, Dict
 from ..config import AppConfig
-from ..utils import Throttle, with_backoff
+from ..http_pool import request
+from ..ratelimit import limiter_for
+from ..resilience import budget_for
+from ..utils import with_backoff
 
 API = "https://mb-api.abuse.ch/api/v1/"
 
-def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
-    if not cfg.malwarebazaar.enabled:
-        return {}
-    th = Throttle(cfg.malwarebazaar.rate_limit.requests_per_minute)
-    th.wait()
+def fetch(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    """MalwareBazaar query for one hash; raises once retries are exhausted."""
     data = {"query": "get_info", "hash": h}
     headers = {"User-Agent": "HashIntelLookup/0.2", "Accept": "application/json"}
     if cfg.malwarebazaar.api_key:
         headers["API-KEY"] = cfg.malwarebazaar.api_key
     def do():
-        resp = requests.post(API, data=data, headers=headers, timeout=20)
+        lim = limiter_for(cfg, "malwarebazaar")
+        lim.acquire()
+        resp = request(cfg, "malwarebazaar", "POST", API, data=data, headers=headers, limiter=lim)
+        lim.observe(resp)
         if resp.status_code in (401, 403):
             return {"error": "unauthorized"}
         if resp.status_code >= 500:
             raise RuntimeError(f"MB HTTP {resp.status_code}")
         resp.raise_for_status()
         return resp.json()
+    return with_backoff(do, logger=logger, budget=budget_for(cfg), service="malwarebazaar")
+
+def query_hash(cfg: AppConfig, logger, h: str) -> Dict[str, Any]:
+    if not cfg.malwarebazaar.enabled:
+        return {}
     try:
-        return with_backoff(do, logger=logger)
+        return fetch(cfg, logger, h)
     except Exception as e:  # noqa: BLE001
         logger.warning("MalwareBazaar query failed for %s: %s", h, e)
         return {}
@@ -1,6 +1,11 @@
 from __future__ import annotations
 import hashlib, re, time, logging
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+from .ratelimit import RateLimited
+from . import metrics
+
+if TYPE_CHECKING:
+    from .resilience import RetryBudget
 
 HASH_RE = {
     "md5": re.compile(r"^[a-fA-F0-9]{32}$"),
@@ -18,20 +23,17 @@ def detect_hash_type(s: str) -> Optional[str]:
 def normalize_hash(s: str) -> str:
     return s.strip().lower()
 
-class Throttle:
-    """Simple per-service throttle based on requests/minute."""
-    def __init__(self, rpm: int):
-        self.interval = 60.0 / max(1, rpm)
-        self.last = 0.0
-
-    def wait(self):
-        now = time.time()
-        elapsed = now - self.last
-        if elapsed < self.interval:
-            time.sleep(self.interval - elapsed)
-        self.last = time.time()
-
-def with_backoff(fn, *, retries=3, base=0.5, logger: Optional[logging.Logger]=None):
+def with_backoff(fn, *, retries=3, base=0.5, logger: Optional[logging.Logger]=None,
+                 budget: Optional[RetryBudget]=None, service: str = ""):
+    """
+    Call ``fn`` until it succeeds, sleeping base, 2*base, 4*base... between tries.
+    A 429 (ratelimit.RateLimited) retries without its own sleep: ``fn`` acquires
+    the service limiter, which has already slowed down and honours Retry-After.
+    With a ``budget``, retries stop early once it is spent. Retries are counted
+    in metrics under ``service``.
+    """
+    if budget is not None:
+        budget.on_request()
     for attempt in range(retries + 1):
         try:
             return fn()
@@ -40,6 +42,16 @@ def with_backoff(fn, *, retries=3, base=0.5, logger: Optional[logging.Logger]=No
                 if logger:
                     logger.error("Operation failed after retries: %s", e, exc_info=True)
                 raise
+            if budget is not None and not budget.try_retry():
+                metrics.inc("retries_denied", service=service)
+                if logger:
+                    logger.warning("Retry budget spent; giving up: %s", e)
+                raise
+            metrics.inc("retries", service=service)
+            if isinstance(e, RateLimited):
+                if logger:
+                    logger.warning("%s; retrying at the reduced rate", e)
+                continue
             sleep = base * (2 ** attempt)
             if logger:
                 logger.warning("Transient error: %s; retrying in %.1fs", e, sleep)
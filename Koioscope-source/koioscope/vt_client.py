@@ -1,39 +1,52 @@
 from __future__ import annotations
-import requests
 from typing import Any, Dict, Optional
-from bs4 import BeautifulSoup
-from .utils import Throttle, with_backoff
+from .http_pool import request
+from .ratelimit import limiter_for
+from .resilience import budget_for
+from .utils import with_backoff
+from . import profiling
 from .config import AppConfig
 
 VT_API_URL = "https://www.virustotal.com/api/v3/files/"
 VT_SEARCH_URL = "https://www.virustotal.com/api/v3/intelligence/search"
 VT_WEB_FILE_URL = "https://www.virustotal.com/gui/file/"
 
+def permalink(file_hash: str) -> str:
+    return VT_WEB_FILE_URL + file_hash
+
 class VirusTotalClient:
     def __init__(self, cfg: AppConfig, logger):
         self.api_key = cfg.virustotal.api_key
-        self.throttle = Throttle(cfg.virustotal.rate_limit.requests_per_minute)
+        self.limiter = limiter_for(cfg, "virustotal")
         self.logger = logger
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.cfg = cfg
+        # Sessions are shared per host (http_pool); the key travels per request.
+        self.headers = {
             "x-apikey": self.api_key or "",
             "User-Agent": "HashIntelLookup/0.2",
-        })
+        }
 
     def _get_json(self, url: str, params: Optional[dict]=None) -> Dict[str, Any]:
-        self.throttle.wait()
         def do():
-            resp = self.session.get(url, params=params, timeout=20)
-            if resp.status_code == 429 or resp.status_code >= 500:
+            self.limiter.acquire()
+            resp = request(self.cfg, "virustotal", "GET", url, params=params, headers=self.headers,
+                           limiter=self.limiter)
+            self.limiter.observe(resp)
+            if resp.status_code >= 500:
                 raise RuntimeError(f"VT HTTP {resp.status_code}")
+            if resp.status_code == 404:
+                return {}
             resp.raise_for_status()
             return resp.json()
-        return with_backoff(do, logger=self.logger)
+        return with_backoff(do, logger=self.logger, budget=budget_for(self.cfg), service="virustotal")
+
+    def get_file_report(self, file_hash: str) -> Dict[str, Any]:
+        """Like fetch_file_report, but raises once retries are exhausted."""
+        return self._get_json(VT_API_URL + file_hash)
 
     def fetch_file_report(self, file_hash: str) -> Dict[str, Any]:
-        url = VT_API_URL + file_hash
         try:
-            data = self._get_json(url)
+            data = self.get_file_report(file_hash)
             return data
         except Exception as e:  # noqa: BLE001
             self.logger.warning("VT API failed for %s: %s", file_hash, e)
@@ -51,18 +64,20 @@ class VirusTotalClient:
 
     def scrape_permalink_fields(self, file_hash: str) -> Dict[str, Any]:
         """Scrape non-API fields from VT web page: signer, popular names, tags if visible."""
-        url = VT_WEB_FILE_URL + file_hash
-        self.throttle.wait()
+        url = permalink(file_hash)
         def do():
-            resp = self.session.get(url, timeout=20)
-            if resp.status_code == 429 or resp.status_code >= 500:
+            self.limiter.acquire()
+            resp = request(self.cfg, "virustotal/web", "GET", url, headers=self.headers, limiter=self.limiter)
+            self.limiter.observe(resp)
+            if resp.status_code >= 500:
                 raise RuntimeError(f"VT web HTTP {resp.status_code}")
             resp.raise_for_status()
             return resp.text
-        html = with_backoff(do, logger=self.logger)
-        soup = BeautifulSoup(html, "html.parser")
+        html = with_backoff(do, logger=self.logger, budget=budget_for(self.cfg), service="virustotal/web")
+        from bs4 import BeautifulSoup
+        with profiling.stage("scrape_parse"):
+            text = BeautifulSoup(html, "html.parser").get_text(" ", strip=True)
         out: Dict[str, Any] = {}
-        text = soup.get_text(" ", strip=True)
         for key in ["Signature", "Signer", "Authenticode"]:
             if key in text:
                 out["signer_hint"] = True
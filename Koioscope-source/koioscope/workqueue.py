@@ -0,0 +1,186 @@
+from __future__ import annotations
+import json, os, socket, sqlite3, threading, time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .config import AppConfig
+from .engine import Outcome, ProcessFn
+
+# Rollback journal rather than WAL: WAL needs shared memory, which breaks
+# when workers on several hosts open the queue over a network filesystem.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    row_index INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    comment TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, lease_until);
+CREATE INDEX IF NOT EXISTS jobs_row ON jobs(row_index);
+"""
+
+@dataclass
+class Job:
+    id: int
+    row_index: int
+    query: str
+    comment: str
+
+def connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue(conn: sqlite3.Connection, items: Iterable[Tuple[str, str]]) -> int:
+    """Append (query, comment) pairs after any rows already queued; returns the count added."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        start = conn.execute("SELECT COALESCE(MAX(row_index) + 1, 0) FROM jobs").fetchone()[0]
+        cur = conn.executemany(
+            "INSERT INTO jobs(row_index, query, comment, updated_at) VALUES (?, ?, ?, ?)",
+            ((start + i, q, c or "", time.time()) for i, (q, c) in enumerate(items)))
+        conn.execute("COMMIT")
+        return cur.rowcount
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+def claim(conn: sqlite3.Connection, worker: str, limit: int, lease_s: float) -> List[Job]:
+    """Lease up to ``limit`` pending jobs, or jobs whose previous lease has expired."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            "SELECT id, row_index, query, comment FROM jobs "
+            "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+            "ORDER BY row_index LIMIT ?", (now, limit)).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, "
+            "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            ((worker, now + lease_s, now, r[0]) for r in rows))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return [Job(*r) for r in rows]
+
+def renew(conn: sqlite3.Connection, worker: str, lease_s: float) -> int:
+    """Extend every lease ``worker`` still holds by ``lease_s`` from now; returns how many."""
+    now = time.time()
+    return conn.execute(
+        "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE worker = ? AND status = 'leased'",
+        (now + lease_s, now, worker)).rowcount
+
+def complete(conn: sqlite3.Connection, job: Job, worker: str, result: Dict[str, Any]) -> bool:
+    """Store the job's result; False if its lease was lost to another worker (nothing is written)."""
+    return conn.execute(
+        "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+        "WHERE id = ? AND worker = ? AND status = 'leased'",
+        (json.dumps(result, ensure_ascii=False), time.time(), job.id, worker)).rowcount == 1
+
+def fail(conn: sqlite3.Connection, job: Job, worker: str, error: str, max_attempts: int) -> bool:
+    """
+    Return the job to the queue, or park it as failed once it has used up its
+    attempts; False if its lease was lost to another worker.
+    """
+    return conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+        (max_attempts, error, time.time(), job.id, worker)).rowcount == 1
+
+def counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+def iter_results(conn: sqlite3.Connection) -> Iterator[Dict[str, Any]]:
+    """Report rows in input order; unfinished or failed jobs yield a bare hash/comment row."""
+    for query, comment, result in conn.execute("SELECT query, comment, result FROM jobs ORDER BY row_index"):
+        yield json.loads(result) if result else {"hash": query, "comment": comment}
+
+def run_worker(conn: sqlite3.Connection, cfg: AppConfig, process: ProcessFn, logger, worker: Optional[str] = None,
+               lease_s: float = 900.0, max_attempts: int = 3, poll_s: float = 5.0) -> int:
+    """
+    Claim and process jobs until the queue is drained; returns the number completed here.
+    Jobs go through batch.run_lookup_chunks, so duplicates are looked up once,
+    cached answers skip the engine and bulk endpoints are used. Jobs are claimed
+    ``concurrency.max_in_flight`` at a time, as soon as the last ones have all
+    started, so one slow lookup never holds back the rest. Leases are renewed every ``lease_s / 3`` while this worker is
+    alive, so only a dead worker's jobs expire; those are picked up again, which
+    is why this waits while other workers still hold leases. Results for a job
+    whose lease was lost anyway (e.g. the worker stalled) are dropped, logged and
+    not counted.
+    """
+    worker = worker or default_worker_id()
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        hb = connect(path)  # sqlite3 connections stay on the thread that made them
+        try:
+            while not stop.wait(lease_s / 3):
+                try:
+                    renew(hb, worker, lease_s)
+                except sqlite3.Error as e:
+                    logger.warning("Worker %s: lease renewal failed: %s", worker, e)
+        finally:
+            hb.close()
+
+    beat = threading.Thread(target=heartbeat, name="koioscope-lease", daemon=True)
+    beat.start()
+    try:
+        return _work(conn, path, cfg, process, logger, worker, lease_s, max_attempts, poll_s)
+    finally:
+        stop.set()
+        beat.join()
+
+def _work(conn: sqlite3.Connection, path: str, cfg: AppConfig, process: ProcessFn, logger, worker: str,
+          lease_s: float, max_attempts: int, poll_s: float) -> int:
+    from .batch import run_lookup_chunks  # the lookup stack, which enqueue/collect don't need
+    jobs: Dict[int, Job] = {}  # batch row index -> job
+    changed = threading.Event()  # a job of ours finished: there may be work to retry, or none left
+    done = lost = 0
+
+    def claimed() -> Iterator[List[Tuple[str, str]]]:
+        # Runs on the engine's input threads, so it opens its own connections.
+        while True:
+            changed.clear()
+            feed = connect(path)
+            try:
+                batch = claim(feed, worker, max(1, cfg.concurrency.max_in_flight), lease_s)
+                busy = not batch and counts(feed).get("leased")
+            finally:
+                feed.close()
+            if batch:
+                for j in batch:
+                    jobs[len(jobs)] = j
+                yield [(j.query, j.comment) for j in batch]
+            elif busy:
+                changed.wait(poll_s)
+            else:
+                return
+
+    def on_outcome(out: Outcome) -> None:
+        nonlocal done, lost
+        job = jobs[out.index]
+        if out.error is not None:
+            kept = fail(conn, job, worker, str(out.error), max_attempts)
+        else:
+            kept = complete(conn, job, worker, out.result or {})
+            done += kept
+        changed.set()
+        if not kept:
+            lost += 1
+            logger.warning("Worker %s: lease on job %d (%s) was lost; result dropped", worker, job.id, job.query)
+
+    run_lookup_chunks(cfg, logger, claimed(), process, on_outcome, cfg.vendor_allowlist)
+    logger.info("Worker %s: %d jobs done, %d leases lost", worker, done, lost)
+    return done
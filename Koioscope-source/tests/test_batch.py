@@ -0,0 +1,68 @@
+import logging, time
+from koioscope import cache, lookup
+from koioscope.batch import partition, run_lookup_batch
+from koioscope.config import AppConfig
+
+A = "a" * 64
+B = "b" * 64
+
+def test_partition_dedups_normalized_hashes():
+    groups = partition([(A.upper(), "x"), ("evil.exe ", ""), (A, "y")])
+    assert list(groups) == [A, "evil.exe"]
+    assert [c for _, _, c in groups[A]] == ["x", "y"]
+
+def test_cached_rows_first_and_misses_fanned_out(tmp_path):
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path)
+    raw = {k: {} for k in lookup.SOURCE_KEYS}
+    raw["vt_api"] = {"data": {"attributes": {"last_analysis_stats": {"malicious": 2, "harmless": 1}}}}
+    cache.save_raw(cfg, A, raw)
+
+    looked_up = []
+    def process(q, c):
+        looked_up.append(q)
+        return {"hash": q, "comment": c}
+
+    outs = []
+    items = [(B, "first"), (A, "cached"), (B.upper(), "dup")]
+    n = run_lookup_batch(cfg, logging.getLogger("t"), items, process, outs.append, [])
+
+    assert n == 3 and looked_up == [B]
+    assert outs[0].index == 1 and outs[0].result["vt_detection_ratio"] == "2/3"
+    assert sorted((o.index, o.result["comment"]) for o in outs[1:]) == [(0, "first"), (2, "dup")]
+
+def test_streaming_chunks_still_dedup(tmp_path):
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path)
+    looked_up = []
+    def process(q, c):
+        looked_up.append(q)
+        time.sleep(0.1)  # keep B in flight while later chunks arrive
+        return {"hash": q, "comment": c}
+
+    outs = []
+    items = iter([(B, "1"), ("x.exe", ""), (B, "2"), (B, "3")])
+    n = run_lookup_batch(cfg, logging.getLogger("t"), items, process, outs.append, [], chunk_rows=1)
+    assert n == 4
+    assert sorted(looked_up) == [B, "x.exe"]
+    assert sorted(o.index for o in outs) == [0, 1, 2, 3]
+
+def test_slow_chunk_prep_does_not_hold_back_finished_lookups(monkeypatch, tmp_path):
+    from koioscope import batch
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path)
+    calls = []
+    def slow_prefetch(cfg, logger, hashes):
+        calls.append(hashes)
+        if len(calls) == 2:
+            time.sleep(1.0)  # the second chunk's bulk requests
+        return 0
+    monkeypatch.setattr(batch, "prefetch_bulk", slow_prefetch)
+
+    t0 = time.monotonic()
+    arrived = []
+    items = [("%064x" % i, "") for i in range(8)]
+    run_lookup_batch(cfg, logging.getLogger("t"), items, lambda q, c: {"hash": q},
+                     lambda out: arrived.append((out.index, time.monotonic() - t0)), [], chunk_rows=4)
+    first_chunk = [t for i, t in arrived if i < 4]
+    assert len(arrived) == 8 and max(first_chunk) < 0.5
@@ -0,0 +1,39 @@
+import json, time
+from koioscope import cache
+from koioscope.config import AppConfig
+
+def _cfg(tmp_path):
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path / "cache")
+    return cfg
+
+def test_raw_roundtrip_and_ttl(tmp_path):
+    cfg = _cfg(tmp_path)
+    assert cache.load_raw(cfg, "ABC") == {}
+    cache.save_raw(cfg, "ABC", {"otx": {"a": 1}})
+    cache.save_raw_many(cfg, "urlhaus", {"abc": {"b": 2}, "D1": {"c": 3}})
+    assert cache.load_raw(cfg, "abc") == {"otx": {"a": 1}, "urlhaus": {"b": 2}}
+    assert set(cache.load_raw_many(cfg, ["abc", "d1", "missing"])) == {"abc", "d1"}
+    cfg.cache.service_ttl_minutes = {"otx": 0}
+    time.sleep(0.01)
+    assert cache.load_raw(cfg, "abc") == {"urlhaus": {"b": 2}}
+
+def test_migrate_json_cache(tmp_path):
+    cfg = _cfg(tmp_path)
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "AAAA.json").write_text(json.dumps({"fetched_at": time.time(), "result": {"hash": "aaaa"}}))
+    (legacy / "broken.json").write_text("{")
+    assert cache.migrate_json_cache(cfg, str(legacy), remove=True) == 1
+    assert cache.load_from_cache(cfg, "aaaa") == {"hash": "aaaa"}
+    assert not (legacy / "AAAA.json").exists()
+    assert (legacy / "broken.json").exists()
+
+def test_results_bulk_roundtrip_and_purge(tmp_path):
+    cfg = _cfg(tmp_path)
+    cache.save_to_cache(cfg, "AA", {"hash": "aa"})
+    assert cache.save_many(cfg, [("bb", {"hash": "bb"}), ("cc", {"hash": "cc"})], fetched_at=0) == 2
+    assert cache.load_many(cfg, ["aa", "BB", "dd"]) == {"aa": {"hash": "aa"}}  # bb is long expired
+    cache.save_raw(cfg, "aa", {"otx": {}})
+    assert cache.purge_expired(cfg) == 2
+    assert cache.load_from_cache(cfg, "aa") == {"hash": "aa"} and cache.load_raw(cfg, "aa") == {"otx": {}}
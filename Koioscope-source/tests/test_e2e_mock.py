@@ -0,0 +1,30 @@
+import logging, os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from mock_intel import Behaviour, MockIntel
+from throughput import synthetic_hashes
+from koioscope import http_pool, ratelimit, resilience
+from koioscope.batch import run_lookup_batch
+from koioscope.cli import process_one
+from koioscope.vt_client import VirusTotalClient
+
+def test_batch_against_mock_services(tmp_path):
+    ratelimit.reset_limiters()
+    resilience.reset()
+    logger = logging.getLogger("test")
+    hashes = synthetic_hashes(30, dup_ratio=0.3)
+    with MockIntel(Behaviour(latency_ms=0, known_ratio=1.0)) as mock:
+        cfg = mock.config(str(tmp_path))
+        vt = VirusTotalClient(cfg, logger)
+        outs = []
+        n = run_lookup_batch(cfg, logger, [(h, "c") for h in hashes],
+                             lambda q, c: process_one(cfg, logger, vt, q, c), outs.append, [])
+        stats = mock.stats()
+    http_pool.close_sessions()
+    assert n == len(hashes) == len(outs)
+    assert all(o.error is None and o.result["unavailable_sources"] == "" for o in outs)
+    assert all(o.result["vt_detection_ratio"] == "3/8" for o in outs)
+    # Duplicate rows are looked up once: one API call per unique hash on each per-hash source.
+    assert stats["otx"] == {200: len(set(hashes))}
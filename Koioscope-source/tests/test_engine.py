@@ -0,0 +1,27 @@
+import threading, time
+from koioscope.engine import run_batch
+
+def test_run_batch_caps_in_flight_and_keeps_index():
+    lock = threading.Lock()
+    state = {"cur": 0, "peak": 0}
+
+    def process(q, c):
+        with lock:
+            state["cur"] += 1
+            state["peak"] = max(state["peak"], state["cur"])
+        time.sleep(0.02 if int(q) % 2 else 0.05)
+        with lock:
+            state["cur"] -= 1
+        if q == "7":
+            raise RuntimeError("boom")
+        return {"hash": q, "comment": c}
+
+    outs = []
+    n = run_batch(((str(i), f"c{i}") for i in range(20)), process, outs.append, max_in_flight=4)
+
+    assert n == 20
+    assert state["peak"] == 4
+    assert sorted(o.index for o in outs) == list(range(20))
+    failed = [o for o in outs if o.error]
+    assert [o.query for o in failed] == ["7"]
+    assert all(o.result["comment"] == f"c{o.index}" for o in outs if not o.error)
@@ -0,0 +1,42 @@
+import pytest
+
+tk = pytest.importorskip("tkinter")
+from koioscope.gui_table import Viewport, VirtualTable
+from koioscope.report import ResultStore
+
+def test_viewport_window_and_scrolling():
+    v = Viewport()
+    v.update(total=5, page=20)
+    assert v.window() == range(0, 5) and v.fraction() == (0.0, 1.0)
+    v.update(total=100_000, page=20)
+    v.scroll(-3)
+    assert v.first == 0
+    v.moveto(0.5)
+    assert v.window() == range(50_000, 50_020)
+    v.moveto(1.0)
+    assert v.window() == range(99_980, 100_000) and v.fraction()[1] == 1.0
+    v.show(10)
+    assert v.first == 10
+    v.show(45)
+    assert v.window() == range(26, 46)
+
+def test_table_holds_only_visible_rows():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    try:
+        store = ResultStore()
+        for i in range(100_000):
+            store.append({"hash": "%064x" % i, "comment": "c"})
+        table = VirtualTable(root, store, ("hash", "comment"), {})
+        table.pack(fill="both", expand=True)
+        root.geometry("600x400")
+        root.update()
+        table.refresh()
+        slots = table.tree.get_children()
+        assert 0 < len(slots) < 100
+        table._on_scrollbar("moveto", "0.5")
+        assert table.tree.item(slots[0], "values")[0] == "%064x" % 50_000
+    finally:
+        root.destroy()
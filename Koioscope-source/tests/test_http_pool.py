@@ -0,0 +1,100 @@
+from koioscope.config import AppConfig
+from koioscope.http_pool import session_for, close_sessions, pool_size
+
+def test_sessions_are_shared_per_host():
+    close_sessions()
+    cfg = AppConfig()
+    a = session_for(cfg, "https://mb-api.abuse.ch/api/v1/")
+    assert session_for(cfg, "https://MB-API.abuse.ch/other") is a
+    assert session_for(cfg, "https://urlhaus-api.abuse.ch/v1/payload/") is not a
+    close_sessions()
+
+def test_pool_sized_for_batch_concurrency():
+    close_sessions()
+    cfg = AppConfig()
+    cfg.concurrency.max_in_flight = 64
+    assert pool_size(cfg) == 128
+    s = session_for(cfg, "https://hashlookup.circl.lu/lookup/md5/x")
+    assert s.get_adapter("https://hashlookup.circl.lu/")._pool_maxsize == 128
+    cfg.http.pool_maxsize = 7
+    assert pool_size(cfg) == 7
+    close_sessions()
+
+def test_timeout_follows_observed_latency():
+    from koioscope.http_pool import LatencyTracker
+    cfg = AppConfig()
+    t = LatencyTracker()
+    assert t.timeout(cfg, 20) == 20  # no data yet
+    for _ in range(50):
+        t.record(2.0)
+    assert t.timeout(cfg, 20) == 6.0
+    for _ in range(200):
+        t.record(0.1)
+    assert t.timeout(cfg, 20) == cfg.timeouts.min_s
+
+def test_slow_get_is_hedged_and_first_answer_wins():
+    import time
+    from types import SimpleNamespace
+    from koioscope import http_pool
+    from koioscope.ratelimit import TokenBucket
+
+    class Session:
+        def __init__(self):
+            self.calls = 0
+        def get(self, url, **kw):
+            self.calls += 1
+            time.sleep(0.5 if self.calls == 1 else 0.01)
+            return SimpleNamespace(status_code=200, text="answer %d" % self.calls)
+
+    close_sessions()
+    cfg = AppConfig()
+    cfg.timeouts.hedge = ["otx"]
+    s = http_pool._sessions["https://otx.example"] = Session()
+    tracker = http_pool.tracker_for("otx")
+    for _ in range(30):
+        tracker.record(0.05)
+    t0 = time.monotonic()
+    assert http_pool.request(cfg, "otx", "GET", "https://otx.example/x", limiter=TokenBucket(600, 2)).text == "answer 2"
+    assert time.monotonic() - t0 < 0.3 and s.calls == 2
+    http_pool._sessions.clear()
+
+def test_timeouts_count_as_latency_and_hedge_pool_fits_concurrency():
+    import pytest, requests
+    from koioscope import http_pool
+
+    class Session:
+        def request(self, method, url, **kw):
+            raise requests.Timeout("slow")
+
+    close_sessions()
+    cfg = AppConfig()
+    http_pool._sessions["https://slow.example"] = Session()
+    with pytest.raises(requests.Timeout):
+        http_pool.request(cfg, "slow", "GET", "https://slow.example/x", timeout=7.0)
+    assert http_pool.tracker_for("slow")._samples[-1] == 7.0
+    http_pool._sessions.clear()
+
+    cfg.concurrency.max_in_flight = 40
+    cfg.timeouts.hedge = ["virustotal", "otx"]  # VT makes two hedged calls per hash
+    assert http_pool.hedge_pool(cfg)._max_workers == 40 * 3 * 2
+
+def test_time_queued_for_a_thread_does_not_trigger_a_hedge():
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+    from koioscope import http_pool
+
+    class Session:
+        calls = 0
+        def get(self, url, **kw):
+            self.calls += 1
+            time.sleep(0.02)
+            return SimpleNamespace(status_code=200)
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    for _ in range(2):
+        pool.submit(time.sleep, 0.2)  # every thread busy: the primary waits its turn
+    s = Session()
+    http_pool._hedged_get(pool, s, "https://otx.example/x", {}, 0.1, None)
+    assert s.calls == 1
+    pool.shutdown()
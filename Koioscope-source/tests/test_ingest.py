@@ -0,0 +1,27 @@
+import gzip
+from openpyxl import Workbook
+from koioscope.ingest import iter_batch
+
+MD5 = "44d88612fea8a8f36de82e1278abb02f"
+
+def test_csv_normalizes_and_drops_bad_rows(tmp_path):
+    p = tmp_path / "b.csv"
+    p.write_text("Hash,comment\n" + MD5.upper() + ",eicar\n,empty\nabc123,typo\nevil.exe,\n", encoding="utf-8")
+    assert list(iter_batch(str(p))) == [(MD5, "eicar"), ("evil.exe", "")]
+
+def test_gzip_text_and_xlsx(tmp_path):
+    gz = tmp_path / "hashes.txt.gz"
+    with gzip.open(gz, "wt") as f:
+        f.write("# exported\n" + MD5 + "\n\n" + "A" * 64 + "\n")
+    assert list(iter_batch(str(gz))) == [(MD5, ""), ("a" * 64, "")]
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["hash", "comment"])
+    ws.append([MD5, None])
+    ws.append(["B" * 40, "x"])
+    xl = tmp_path / "b.xlsx"
+    wb.save(xl)
+    it = iter_batch(str(xl))
+    assert next(it) == (MD5, "")
+    assert list(it) == [("b" * 40, "x")]
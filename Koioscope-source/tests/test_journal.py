@@ -0,0 +1,48 @@
+import logging
+from koioscope import journal
+from koioscope.batch import run_lookup_batch
+from koioscope.config import AppConfig
+from koioscope.engine import Outcome
+
+def test_resume_skips_done_and_retries_failed(tmp_path):
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path)
+    conn = journal.connect(journal.journal_path(cfg))
+    src = tmp_path / "in.txt"
+    src.write_text("a.exe\nb.exe\nc.exe\n")
+    items = [("a.exe", ""), ("b.exe", ""), ("c.exe", "")]
+    fp = journal.fingerprint(str(src))
+    rid = journal.default_run_id(str(src), fp)
+
+    def first(q, c):
+        if q != "a.exe":
+            raise RuntimeError("vpn down")
+        return {"hash": q, "comment": c}
+    done = journal.start_run(conn, rid, str(src), fp)
+    run_lookup_batch(cfg, logging.getLogger("t"), items, first,
+                     lambda o: journal.record(conn, rid, o), [], skip=done)
+    assert journal.counts(conn, rid) == {"done": 1, "failed": 2}
+
+    calls = []
+    def second(q, c):
+        calls.append(q)
+        return {"hash": q, "comment": c, "vt_detection_ratio": "0/1"}
+    done = journal.start_run(conn, rid, str(src), fp, resume=True)
+    assert done == {0}
+    n = run_lookup_batch(cfg, logging.getLogger("t"), items, second,
+                         lambda o: journal.record(conn, rid, o), [], skip=done)
+    assert n == 2 and sorted(calls) == ["b.exe", "c.exe"]
+    assert [r["hash"] for r in journal.iter_rows(conn, rid)] == ["a.exe", "b.exe", "c.exe"]
+
+def test_fresh_run_discards_journal_and_changed_input_refuses_resume(tmp_path):
+    conn = journal.connect(str(tmp_path / "runs.sqlite3"))
+    journal.start_run(conn, "r", "in.csv", "fp1")
+    journal.record(conn, "r", Outcome(0, "h", "", {"hash": "h"}))
+    assert journal.start_run(conn, "r", "in.csv", "fp1", resume=True) == {0}
+    try:
+        journal.start_run(conn, "r", "in.csv", "fp2", resume=True)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert journal.start_run(conn, "r", "in.csv", "fp2") == set()
+    assert journal.counts(conn, "r") == {}
@@ -0,0 +1,56 @@
+import logging
+import pytest
+from koioscope import knowngood, lookup, resilience
+from koioscope.config import AppConfig
+
+LOG = logging.getLogger("test")
+GOOD = "d41d8cd98f00b204e9800998ecf8427e"
+OTHER = "44d88612fea8a8f36de82e1278abb02f"
+
+def test_filter_round_trip_and_format(tmp_path):
+    path = str(tmp_path / "good.bloom")
+    values = ["%032X" % i for i in range(2000)]
+    knowngood.write_filter(path, values, p=0.001, n=4000)
+    bf = knowngood.BloomFilter(path)
+    assert (bf.n, bf.count, bf.k) == (4000, 2000, 10)
+    assert all(v in bf for v in values)
+    assert sum("%032X" % (i + 10 ** 6) in bf for i in range(2000)) <= 10  # ~0.1% false positives
+    bf.close()
+    (tmp_path / "bad.bloom").write_bytes(b"\x02" + bytes(47))
+    with pytest.raises(ValueError):
+        knowngood.BloomFilter(str(tmp_path / "bad.bloom"))
+
+class FakeVT:
+    calls = 0
+    def get_file_report(self, h):
+        self.calls += 1
+        return {"data": {"id": h, "attributes": {}}}
+    def scrape_permalink_fields(self, h):
+        return {}
+
+@pytest.mark.parametrize("mode,asked", [("tag", 8), ("hashlookup", 1), ("skip", 0)])
+def test_known_good_hashes_are_tagged_and_cut_down(monkeypatch, tmp_path, mode, asked):
+    resilience.reset()
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path)
+    cfg.known_good.bloom_path = str(tmp_path / "good.bloom")
+    cfg.known_good.mode = mode
+    knowngood.write_filter(cfg.known_good.bloom_path, [GOOD.upper()])
+    calls = []
+    def make(name):
+        def fn(cfg, logger, h):
+            calls.append(name)
+            return {"hash": h}
+        return fn
+    monkeypatch.setattr(lookup, "INDEPENDENT_SOURCES", tuple((n, make(n)) for n, _ in lookup.INDEPENDENT_SOURCES))
+    monkeypatch.setattr(lookup.malshare, "fetch", make("malshare"))
+    vt = FakeVT()
+
+    row = lookup.lookup_hash(cfg, LOG, vt, GOOD, "", [])
+    assert "KnownGood" in row["indicator_tags"].split(";")
+    assert len(calls) + vt.calls == asked  # the VT page isn't scraped for an empty report
+    if mode == "hashlookup":
+        assert calls == ["hashlookup"]
+    calls.clear()
+    row = lookup.lookup_hash(cfg, LOG, vt, OTHER, "", [])
+    assert "KnownGood" not in row["indicator_tags"] and "hashlookup" in calls and vt.calls
@@ -0,0 +1,232 @@
+import logging, time
+from koioscope import cache, lookup, resilience
+from koioscope.config import AppConfig
+
+LOG = logging.getLogger("test")
+MD5 = "44d88612fea8a8f36de82e1278abb02f"
+
+class FakeVT:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def get_file_report(self, h):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"data": {"id": h, "attributes": {"md5": MD5, "last_analysis_results": {"A": {"category": "malicious", "engine_version": "1"}}}}}
+
+    def scrape_permalink_fields(self, h):
+        time.sleep(self.delay)
+        return {"permalink": "https://vt/" + h}
+
+def _cfg(tmp_path):
+    resilience.reset()
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path)
+    return cfg
+
+def _patch_sources(monkeypatch, delay=0.0, calls=None, fail=()):
+    def make(name):
+        def fn(cfg, logger, h):
+            if calls is not None:
+                calls.append(name)
+            time.sleep(delay)
+            if name in fail:
+                raise RuntimeError("down")
+            return {"source": name, "hash": h}
+        return fn
+    monkeypatch.setattr(lookup, "INDEPENDENT_SOURCES", tuple((n, make(n)) for n, _ in lookup.INDEPENDENT_SOURCES))
+    monkeypatch.setattr(lookup.malshare, "fetch", make("malshare"))
+
+def test_query_sources_runs_concurrently(monkeypatch, tmp_path):
+    _patch_sources(monkeypatch, delay=0.2)
+    t0 = time.monotonic()
+    res = lookup.query_sources(_cfg(tmp_path), LOG, FakeVT(delay=0.2), "a" * 64)
+    elapsed = time.monotonic() - t0
+
+    assert set(res.raw) == set(lookup.SOURCE_KEYS)
+    assert res.raw["otx"]["hash"] == "a" * 64
+    assert res.raw["malshare"]["hash"] == MD5
+    # VT then MalShare is the critical path; everything else overlaps it.
+    assert elapsed < 0.9
+
+def test_raw_cache_refetches_only_failed_or_stale(monkeypatch, tmp_path):
+    cfg = _cfg(tmp_path)
+    calls = []
+    _patch_sources(monkeypatch, calls=calls, fail=("otx",))
+    vt = FakeVT()
+    first = lookup.query_sources(cfg, LOG, vt, "b" * 64)
+    assert first.failed == ["otx"]
+    # cached VT report is trimmed to what merge needs
+    assert first.raw["vt_api"]["data"]["attributes"]["last_analysis_results"] == {"A": {"category": "malicious"}}
+
+    calls.clear()
+    _patch_sources(monkeypatch, calls=calls)
+    second = lookup.query_sources(cfg, LOG, vt, "b" * 64)
+    assert calls == ["otx"] and vt.calls == 1
+    assert second.raw["malwarebazaar"]["source"] == "malwarebazaar"
+
+    cfg.cache.service_ttl_minutes = {"urlhaus": 0}
+    time.sleep(0.01)
+    calls.clear()
+    lookup.query_sources(cfg, LOG, vt, "b" * 64)
+    assert calls == ["urlhaus"]
+
+def test_alias_index_resolves_other_digests(monkeypatch, tmp_path):
+    cfg = _cfg(tmp_path)
+    sha256 = "c" * 64
+    sha1 = "d" * 40
+
+    class VT(FakeVT):
+        def get_file_report(self, h):
+            self.calls += 1
+            return {"data": {"id": sha256, "attributes": {"md5": MD5, "sha1": sha1, "sha256": sha256}}}
+
+    calls = []
+    _patch_sources(monkeypatch, calls=calls)
+    vt = VT()
+    first = lookup.lookup_hash(cfg, LOG, vt, MD5, "", [])
+    assert first["hash"] == MD5 and vt.calls == 1
+
+    calls.clear()
+    # URLHaus answered for the md5 (it only understands sha256), so only it is re-asked.
+    row = lookup.lookup_hash(cfg, LOG, vt, sha256, "again", [])
+    assert row["hash"] == sha256 and row["comment"] == "again"
+    assert vt.calls == 1 and calls == ["urlhaus"]
+
+    calls.clear()
+    lookup.lookup_hash(cfg, LOG, vt, sha1, "", [])
+    assert vt.calls == 1 and calls == []
+
+def test_prefetch_bulk_fills_raw_cache_in_chunks(monkeypatch, tmp_path):
+    cfg = _cfg(tmp_path)
+    md5s = [f"{i:032x}" for i in range(5)]
+    sha1 = "e" * 40
+    requests = []
+
+    def fake_fetch_many(cfg, logger, htype, hashes):
+        requests.append((htype, list(hashes)))
+        return {h: ({"MD5": h.upper()} if h == md5s[0] else {"found": False}) for h in hashes}
+
+    monkeypatch.setattr(lookup.hashlookup, "BULK_LIMIT", 2)
+    monkeypatch.setattr(lookup.hashlookup, "fetch_many", fake_fetch_many)
+    n = lookup.prefetch_bulk(cfg, LOG, md5s + [sha1, "f" * 64])
+    assert n == 6
+    assert [len(h) for t, h in requests if t == "md5"] == [2, 2, 1]
+    assert ("sha1", [sha1]) in requests
+
+    calls = []
+    _patch_sources(monkeypatch, calls=calls)
+    res = lookup.query_sources(cfg, LOG, FakeVT(), md5s[0])
+    assert "hashlookup" not in calls
+    assert res.raw["hashlookup"] == {"MD5": md5s[0].upper()}
+    # already fresh, so a second prefetch sends nothing
+    requests.clear()
+    lookup.prefetch_bulk(cfg, LOG, md5s)
+    assert requests == []
+
+def test_vt_scrape_only_when_api_lacks_fields(monkeypatch, tmp_path):
+    _patch_sources(monkeypatch)
+    full = {"names": ["a.exe"], "tags": ["peexe"], "signature_info": {"signers": "X"}}
+
+    class VT(FakeVT):
+        def __init__(self, attrs):
+            super().__init__()
+            self.attrs = attrs
+            self.scrapes = 0
+        def get_file_report(self, h):
+            return {"data": {"id": h, "attributes": dict(self.attrs)}}
+        def scrape_permalink_fields(self, h):
+            self.scrapes += 1
+            return {"permalink": "https://vt/" + h, "signer_hint": True}
+
+    cfg = _cfg(tmp_path)
+    vt = VT(full)
+    res = lookup.query_sources(cfg, LOG, vt, "1" * 64)
+    assert vt.scrapes == 0
+    assert res.raw["vt_html"] == {"permalink": "https://www.virustotal.com/gui/file/" + "1" * 64}
+
+    vt = VT({"names": ["a.exe"]})
+    lookup.query_sources(cfg, LOG, vt, "2" * 64)
+    assert vt.scrapes == 1
+
+    vt = VT({})  # unknown to VT: nothing to scrape either
+    lookup.query_sources(cfg, LOG, vt, "3" * 64)
+    assert vt.scrapes == 0
+
+    cfg.virustotal.scrape = "never"
+    vt = VT({"names": ["a.exe"]})
+    assert lookup.query_sources(cfg, LOG, vt, "4" * 64).raw["vt_html"]["permalink"].endswith("4" * 64)
+    assert vt.scrapes == 0
+
+def test_dead_source_is_skipped_then_probed(monkeypatch, tmp_path):
+    cfg = _cfg(tmp_path)
+    cfg.resilience.breaker_failures = 2
+    cfg.resilience.breaker_cooldown_s = 0.2
+    calls = []
+    _patch_sources(monkeypatch, calls=calls, fail=("otx",))
+    vt = FakeVT()
+    for i in range(4):
+        res = lookup.query_sources(cfg, LOG, vt, str(i) * 64)
+    assert calls.count("otx") == 2
+    assert res.skipped == ["otx"] and lookup.unavailable(res) == "otx"
+
+    time.sleep(0.25)
+    _patch_sources(monkeypatch, calls=calls)
+    res = lookup.query_sources(cfg, LOG, vt, "5" * 64)  # half-open probe succeeds
+    assert res.raw["otx"]["source"] == "otx" and lookup.unavailable(res) == ""
+    assert resilience.breaker_for(cfg, "otx").state == "closed"
+
+def test_deadline_returns_partial_and_fills_in_later(monkeypatch, tmp_path):
+    cfg = _cfg(tmp_path)
+    def slow_otx(cfg, logger, h):
+        time.sleep(0.4)
+        return {"source": "otx-late"}
+    _patch_sources(monkeypatch)
+    monkeypatch.setattr(lookup, "INDEPENDENT_SOURCES",
+                        tuple((n, slow_otx if n == "otx" else fn) for n, fn in lookup.INDEPENDENT_SOURCES))
+    t0 = time.monotonic()
+    res = lookup.query_sources(cfg, LOG, FakeVT(), "e" * 64, deadline_s=0.15)
+    assert time.monotonic() - t0 < 0.35
+    assert res.late == ["otx"] and lookup.unavailable(res) == "otx"
+    assert res.raw["urlhaus"]["source"] == "urlhaus"
+    time.sleep(0.4)
+    assert cache.load_raw(cfg, "e" * 64)["otx"] == {"source": "otx-late"}
+
+def test_late_sources_do_not_hold_the_process_at_exit(tmp_path):
+    import subprocess, sys
+    script = f"""
+import logging, time
+from koioscope import lookup
+from koioscope.config import AppConfig
+cfg = AppConfig()
+cfg.cache.dir = {str(tmp_path)!r}
+def fn(cfg, logger, h):
+    time.sleep(5)
+    return {{}}
+lookup.INDEPENDENT_SOURCES = tuple((n, fn) for n, _ in lookup.INDEPENDENT_SOURCES)
+class VT:
+    def get_file_report(self, h): return {{}}
+    def scrape_permalink_fields(self, h): return {{}}
+lookup.query_sources(cfg, logging.getLogger(), VT(), "f" * 64, deadline_s=0.2)
+"""
+    t0 = time.monotonic()
+    subprocess.run([sys.executable, "-c", script], check=True, timeout=10)
+    assert time.monotonic() - t0 < 3
+
+def test_migrated_entry_serves_lookup_until_raw_exists(monkeypatch, tmp_path):
+    import json
+    cfg = _cfg(tmp_path)
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / f"{MD5}.json").write_text(json.dumps({"fetched_at": time.time(),
+                                                     "result": {"hash": MD5, "comment": "old", "filenames": "x.exe"}}))
+    assert cache.migrate_json_cache(cfg, str(legacy)) == 1
+    calls = []
+    _patch_sources(monkeypatch, calls=calls)
+    vt = FakeVT()
+    row = lookup.lookup_hash(cfg, LOG, vt, MD5, "new", [])
+    assert (row["filenames"], row["comment"], vt.calls, calls) == ("x.exe", "new", 0, [])
+    cache.save_raw(cfg, MD5, {"otx": {}})  # once raw answers exist they win
+    lookup.lookup_hash(cfg, LOG, vt, MD5, "", [])
+    assert vt.calls == 1
@@ -1,3 +1,4 @@
+import pytest
 from koioscope.merge import merge_results
 
 def test_merge_minimal():
@@ -17,3 +18,28 @@ def test_merge_minimal():
     assert res["vt_detection_ratio"].startswith("1/")
     assert "a" in res["filenames"]
     assert "https://vt/xyz" in res["source_links"]
+
+def test_policy_matches_vendors_by_case_glob_and_alias():
+    from koioscope.config import AppConfig
+    from koioscope.merge import MergePolicy, policy_for
+    vt_api = {"data": {"attributes": {"last_analysis_stats": {"malicious": 3},
+                                      "names": ["Microsoft Setup.exe"],
+                                      "last_analysis_results": {e: {"category": "malicious"} for e in
+                                                                ("Microsoft", "TrendMicro-HouseCall", "TrendMicro",
+                                                                 "Kaspersky", "ESET-NOD32")}}}}
+    cfg = AppConfig(vendor_allowlist=["microsoft", "trendmicro*", "nod"], vendor_aliases={"NOD": ["ESET-NOD32"]})
+    policy = policy_for(cfg)
+    assert policy is policy_for(cfg, list(cfg.vendor_allowlist))  # compiled once
+    res = merge_results("h", "", policy, vt_api, {}, {}, {}, {}, {}, {}, {}, {})
+    assert res["av_vendor_matches"] == ("Microsoft:malicious;TrendMicro-HouseCall:malicious;"
+                                        "TrendMicro:malicious;ESET-NOD32:malicious")
+    assert res["indicator_tags"] == "MSSoftware"
+    # A plain list keeps its old meaning: exact, case-sensitive names, no globs or aliases.
+    assert merge_results("h", "", ["Kaspersky", "microsoft", "TrendMicro*", "nod"], vt_api, {}, {}, {}, {}, {}, {}, {}, {}
+                         )["av_vendor_matches"] == "Kaspersky:malicious"
+
+    narrow = MergePolicy(columns=["vt_detection_ratio"])
+    assert merge_results("h", "c", narrow, vt_api, {}, {}, {}, {}, {}, {}, {}, {}) == {
+        "hash": "h", "vt_detection_ratio": "3/3"}
+    with pytest.raises(ValueError):
+        MergePolicy(columns=["nope"])
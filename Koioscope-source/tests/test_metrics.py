@@ -0,0 +1,53 @@
+import json
+from koioscope import metrics
+from koioscope.config import AppConfig
+from koioscope.metrics import Metrics
+from koioscope.utils import with_backoff
+
+def test_summary_groups_by_service_and_source():
+    m = Metrics()
+    for status in ("200", "200", "429", "500", "error"):
+        m.inc("requests", service="otx", status=status)
+    m.inc("retries", 2, service="otx")
+    m.inc("throttle_wait_seconds", 1.5, service="otx")
+    for s in (0.03, 0.2, 0.2, 0.7, 12.0):
+        m.observe("otx", s)
+    m.inc("cache_hits", 3, source="vt_api")
+    m.inc("cache_misses", source="vt_api")
+    out = m.summary()
+    otx = out["services"]["otx"]
+    assert (otx["requests"], otx["throttled"], otx["errors"], otx["retries"]) == (5, 1, 2, 2)
+    assert otx["throttle_wait_s"] == 1.5
+    assert otx["latency_s"]["p50"] == 0.25 and otx["latency_s"]["p99"] == 30.0
+    assert out["cache"]["vt_api"] == {"hits": 3, "misses": 1, "hit_ratio": 0.75}
+
+def test_prometheus_textfile(tmp_path):
+    metrics.reset()
+    metrics.inc("requests", service="hashlookup/bulk", status="200")
+    metrics.observe("hashlookup/bulk", 0.3)
+    cfg = AppConfig()
+    cfg.metrics.summary_path = str(tmp_path / "m.jsonl")
+    cfg.metrics.textfile_path = str(tmp_path / "koioscope.prom")
+    metrics.emit(cfg, run="t")
+    metrics.emit(cfg, run="t")
+    text = (tmp_path / "koioscope.prom").read_text()
+    assert 'koioscope_requests_total{service="hashlookup/bulk",status="200"} 1' in text
+    assert 'koioscope_request_duration_seconds_bucket{le="0.25",service="hashlookup/bulk"} 0' in text
+    assert 'koioscope_request_duration_seconds_bucket{le="0.5",service="hashlookup/bulk"} 1' in text
+    assert 'koioscope_request_duration_seconds_count{service="hashlookup/bulk"} 1' in text
+    lines = (tmp_path / "m.jsonl").read_text().splitlines()
+    assert len(lines) == 2 and json.loads(lines[0])["services"]["hashlookup/bulk"]["requests"] == 1
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(".tmp")]
+    metrics.reset()
+
+def test_retries_are_counted():
+    metrics.reset()
+    calls = []
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("boom")
+        return "ok"
+    assert with_backoff(flaky, base=0, service="urlhaus") == "ok"
+    assert metrics.REGISTRY.summary()["services"]["urlhaus"]["retries"] == 2
+    metrics.reset()
@@ -0,0 +1,39 @@
+import pstats, threading, time
+from koioscope import profiling
+
+def test_stages_are_timed_only_when_enabled():
+    profiling.disable()
+    with profiling.stage("merge"):
+        pass
+    profiling.enable()
+    with profiling.stage("merge"):
+        time.sleep(0.01)
+    profiling.record("network", 0.5)
+    assert list(profiling.timed_iter("ingest", iter("ab"))) == ["a", "b"]
+    s = profiling.summary(rows=2)
+    profiling.disable()
+    assert list(s["stages"]) == ["ingest", "network", "merge"]  # pipeline order
+    assert s["stages"]["merge"]["calls"] == 1 and s["stages"]["merge"]["mean_ms"] >= 10
+    assert s["stages"]["ingest"]["calls"] == 3  # two rows and the end of input
+    assert s["stages"]["network"]["per_row_ms"] == 250
+    assert "network" in "\n".join(profiling.describe(s))
+
+def _busy(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_run_profiler_covers_worker_threads(tmp_path):
+    for name in ("run.prof", "run.folded"):
+        path = str(tmp_path / name)
+        prof = profiling.RunProfiler(path, interval_s=0.001).start()
+        stop = threading.Event()
+        t = threading.Thread(target=_busy, args=(stop,))
+        t.start()
+        time.sleep(0.1)
+        stop.set()
+        t.join()
+        prof.stop()
+        if name.endswith(".prof"):
+            assert any(fn[2] == "_busy" for fn in pstats.Stats(path).stats)
+        else:
+            assert "_busy (test_profiling.py:" in open(path, encoding="utf-8").read()
@@ -0,0 +1,96 @@
+import asyncio, threading
+from koioscope.config import AppConfig
+from koioscope.ratelimit import TokenBucket, get_limiter, limiter_for, reset_limiters
+
+def test_bucket_allows_burst_then_paces():
+    b = TokenBucket(rpm=600, burst=3)  # 10/s
+    assert [b.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    delays = [b.reserve() for _ in range(2)]
+    assert 0.05 < delays[0] <= 0.1
+    assert 0.15 < delays[1] <= 0.2
+
+def test_bucket_reservations_are_unique_across_threads():
+    b = TokenBucket(rpm=60, burst=1)
+    delays = []
+    ts = [threading.Thread(target=lambda: delays.append(b.reserve())) for _ in range(8)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    # each thread got its own slot, one second apart
+    assert sorted(round(d) for d in delays) == list(range(8))
+
+def test_async_acquire():
+    b = TokenBucket(rpm=6000, burst=1)
+    async def go():
+        return await asyncio.gather(*(b.acquire_async() for _ in range(5)))
+    assert max(asyncio.run(go())) < 0.05 + 1e-3
+
+def test_registry_is_shared_per_service():
+    reset_limiters()
+    cfg = AppConfig()
+    cfg.urlhaus.rate_limit.requests_per_minute = 10
+    a = limiter_for(cfg, "urlhaus")
+    assert limiter_for(cfg, "urlhaus") is a
+    assert get_limiter("urlhaus", 20) is a and a.rpm == 20
+    assert limiter_for(cfg, "otx") is not a
+
+class _Resp:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+
+def test_retry_after_header_forms():
+    from koioscope.ratelimit import retry_after
+    assert retry_after(_Resp(429, {"Retry-After": "7"})) == 7.0
+    assert 0 < retry_after(_Resp(429, {"Retry-After": "Wed, 21 Oct 2099 07:28:00 GMT"}))
+    assert retry_after(_Resp(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "30"})) == 30.0
+    assert retry_after(_Resp(200, {"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": "30"})) is None
+
+def test_429_halves_rate_once_per_event_and_honours_retry_after():
+    from koioscope.ratelimit import RateLimited
+    b = TokenBucket(rpm=600, burst=1, name="vt")
+    try:
+        b.observe(_Resp(429, {"Retry-After": "2"}))
+        assert False, "expected RateLimited"
+    except RateLimited as e:
+        assert e.retry_after == 2.0 and e.service == "vt"
+    assert b.rpm == 300
+    try:
+        b.observe(_Resp(429))  # another in-flight request of the same burst
+    except RateLimited:
+        pass
+    assert b.rpm == 300
+    assert 2.0 <= b.reserve() < 2.5
+
+def test_success_probes_up_to_max_rpm():
+    b = TokenBucket(rpm=60, burst=1, max_rpm=66)
+    for _ in range(3):
+        b._changed = float("-inf")  # pretend a probe interval has passed
+        b.observe(_Resp(200))
+    assert b.rpm == 66
+    assert TokenBucket(rpm=60).max_rpm == 120  # unset: probes up to twice the configured rate
+    c = TokenBucket(rpm=60, max_rpm=60)
+    c.on_throttle()
+    c._changed = float("-inf")
+    c.on_success()
+    assert c.rpm == 36  # recovering towards, but never past, the configured rate
+
+def test_registry_keeps_adapted_rate():
+    reset_limiters()
+    cfg = AppConfig()
+    a = limiter_for(cfg, "otx")
+    a.on_throttle()
+    assert limiter_for(cfg, "otx").rpm == a.base_rpm / 2
+
+def test_backoff_retries_429_without_sleeping():
+    import time
+    from koioscope.ratelimit import RateLimited
+    from koioscope.utils import with_backoff
+    calls = []
+    def fn():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimited("otx")
+        return "ok"
+    t0 = time.monotonic()
+    assert with_backoff(fn) == "ok" and len(calls) == 3
+    assert time.monotonic() - t0 < 0.2
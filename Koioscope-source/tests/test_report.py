@@ -0,0 +1,77 @@
+import csv, json
+from koioscope.report import REPORT_COLUMNS, ReportWriter, OrderedRows, write_report
+
+def test_csv_rows_are_on_disk_before_close(tmp_path):
+    p = tmp_path / "r.csv"
+    w = ReportWriter(str(p), fsync_rows=1)
+    w.write({"hash": "a" * 32, "comment": "x", "unknown": "ignored"})
+    with open(p, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["hash"] == "a" * 32 and rows[0]["signer"] == ""
+    w.close()
+    with open(p, encoding="utf-8") as f:
+        assert next(csv.reader(f)) == REPORT_COLUMNS
+
+def test_jsonl_has_report_columns(tmp_path):
+    p = tmp_path / "r.jsonl"
+    write_report([{"hash": "h1", "comment": None}, {"hash": "h2"}], str(p))
+    lines = [json.loads(l) for l in p.read_text(encoding="utf-8").splitlines()]
+    assert [l["hash"] for l in lines] == ["h1", "h2"]
+    assert list(lines[0]) == REPORT_COLUMNS and lines[0]["comment"] == ""
+
+class _Sink:
+    def __init__(self):
+        self.rows = []
+    def write(self, row):
+        self.rows.append(row["hash"])
+
+def test_ordered_rows_restores_input_order():
+    sink = _Sink()
+    o = OrderedRows(sink)
+    for i in (2, 0, 3, 1):
+        o.add(i, {"hash": str(i)})
+    assert sink.rows == ["0", "1", "2", "3"]
+
+def test_ordered_rows_window_bounds_memory():
+    sink = _Sink()
+    o = OrderedRows(sink, window=2)
+    for i in (1, 2, 3):  # row 0 is slow
+        o.add(i, {"hash": str(i)})
+    assert sink.rows == ["1", "2", "3"]
+    o.add(0, {"hash": "0"})
+    o.flush()
+    assert sink.rows == ["1", "2", "3", "0"]
+
+def test_result_store_round_trips_and_shares_values(tmp_path):
+    from koioscope.report import ResultStore
+    rows = [{"hash": h, "comment": "campaign 1", "indicator_tags": "peexe;signed",
+             "source_links": f"https://www.virustotal.com/gui/file/{h};https://bazaar.abuse.ch/sample/{h}/"}
+            for h in ("a" * 64, "b" * 64, "c" * 64)]
+    rows.append({"hash": "d" * 64, "comment": None})  # failed row: only hash and comment
+    store = ResultStore.from_rows(rows)
+    assert len(store) == 4
+    assert store[1]["source_links"] == rows[1]["source_links"]
+    assert store[-1] == {**{c: "" for c in REPORT_COLUMNS}, "hash": "d" * 64}
+    assert store.values(0, ("hash", "comment")) == ("a" * 64, "campaign 1")
+    # Repeated values, and links that differ only by the row's hash, are stored once.
+    assert store.distinct("comment") == store.distinct("indicator_tags") == store.distinct("source_links") == 2
+    p = tmp_path / "r.xlsx"
+    write_report(store, str(p))
+    import pandas as pd
+    df = pd.read_excel(p).fillna("")
+    assert list(df["hash"]) == [r["hash"] for r in rows] and df["source_links"][2] == rows[2]["source_links"]
+
+def test_result_store_reports_in_key_order(tmp_path):
+    import csv
+    from koioscope.report import ResultStore, write_report
+    store = ResultStore()
+    store.append({"hash": "single"})
+    base = store.next_key
+    for i in (2, 0, 1):  # a batch finishing out of order
+        store.append({"hash": f"b{i}"}, base + i)
+    store.append({"hash": "later"})
+    assert store[1]["hash"] == "b2"  # the table shows arrival order
+    out = tmp_path / "r.csv"
+    write_report(store, str(out))
+    with open(out, newline="", encoding="utf-8") as f:
+        assert [r["hash"] for r in csv.DictReader(f)] == ["single", "b0", "b1", "b2", "later"]
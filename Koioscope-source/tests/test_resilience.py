@@ -0,0 +1,32 @@
+import time
+from koioscope.resilience import CircuitBreaker, RetryBudget
+from koioscope.utils import with_backoff
+
+def test_breaker_opens_half_opens_and_reopens():
+    b = CircuitBreaker(threshold=2, cooldown_s=0.1)
+    assert b.allow() and not b.failure()
+    assert b.failure() and b.state == "open"
+    assert not b.allow()
+    time.sleep(0.12)
+    assert b.allow() and b.state == "half_open"
+    assert not b.allow()  # only one probe at a time
+    assert b.failure() and b.state == "open"
+    time.sleep(0.12)
+    assert b.allow()
+    b.success()
+    assert b.state == "closed" and b.failures == 0
+
+def test_retry_budget_caps_retries_to_fraction_of_traffic():
+    budget = RetryBudget(ratio=0.1, reserve=2)
+    calls = []
+    def always_fails():
+        calls.append(1)
+        raise RuntimeError("down")
+    for _ in range(20):
+        try:
+            with_backoff(always_fails, base=0, budget=budget)
+        except RuntimeError:
+            pass
+    retries = len(calls) - 20
+    assert retries <= 2 + 0.1 * 20
+    assert retries >= 2
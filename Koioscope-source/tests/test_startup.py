@@ -0,0 +1,12 @@
+import os, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_cli_import_stays_light():
+    # Heavy dependencies load only on the code paths that need them (see benchmarks/startup.py).
+    code = ("import sys, koioscope.cli; "
+            "print(' '.join(m for m in ('pandas', 'bs4', 'tqdm', 'requests', 'asyncio', 'openpyxl') "
+            "if m in sys.modules))")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    assert out.stdout.strip() == ""
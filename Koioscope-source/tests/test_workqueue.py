@@ -0,0 +1,81 @@
+import logging, time
+from koioscope import workqueue
+from koioscope.config import AppConfig
+
+def _cfg(tmp_path, max_in_flight):
+    cfg = AppConfig()
+    cfg.cache.dir = str(tmp_path / "cache")
+    cfg.concurrency.max_in_flight = max_in_flight
+    cfg.hashlookup.enabled = False  # no bulk prefetch over the network
+    return cfg
+
+def test_claims_are_disjoint_and_leases_expire(tmp_path):
+    conn = workqueue.connect(str(tmp_path / "q.sqlite"))
+    assert workqueue.enqueue(conn, [(f"h{i}", f"c{i}") for i in range(5)]) == 5
+    a = workqueue.claim(conn, "a", 3, lease_s=60)
+    b = workqueue.claim(conn, "b", 3, lease_s=60)
+    assert [j.query for j in a] == ["h0", "h1", "h2"]
+    assert [j.query for j in b] == ["h3", "h4"]
+    assert workqueue.claim(conn, "c", 3, lease_s=60) == []
+    # an expired lease can be taken over
+    conn.execute("UPDATE jobs SET lease_until = 0 WHERE worker = 'a'")
+    assert len(workqueue.claim(conn, "c", 10, lease_s=60)) == 3
+
+def test_worker_drains_queue_and_retries_failures(tmp_path):
+    conn = workqueue.connect(str(tmp_path / "q.sqlite"))
+    workqueue.enqueue(conn, [("h0", "x"), ("bad", ""), ("h2", "y")])
+    calls = []
+
+    def process(q, c):
+        calls.append(q)
+        if q == "bad":
+            raise RuntimeError("down")
+        return {"hash": q, "comment": c, "vt_detection_ratio": "0/70"}
+
+    n = workqueue.run_worker(conn, _cfg(tmp_path, 2), process, logging.getLogger("t"), "w1", max_attempts=2)
+    assert n == 2
+    assert calls.count("bad") == 2
+    assert workqueue.counts(conn) == {"done": 2, "failed": 1}
+    rows = list(workqueue.iter_results(conn))
+    assert [r["hash"] for r in rows] == ["h0", "bad", "h2"]
+    assert rows[0]["vt_detection_ratio"] == "0/70"
+
+def test_leases_are_renewed_and_lost_ones_not_counted(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    conn = workqueue.connect(path)
+    workqueue.enqueue(conn, [("h0", ""), ("h1", "")])
+    stolen = []
+
+    def process(q, c):
+        time.sleep(0.5)  # longer than the lease: only the heartbeat keeps it
+        other = workqueue.connect(path)
+        stolen.extend(workqueue.claim(other, "thief", 10, lease_s=60))
+        if q == "h1":  # as if w1 had stalled and another worker had taken over and finished the job
+            other.execute("UPDATE jobs SET worker = 'thief', status = 'done' WHERE query = 'h1'")
+        other.close()
+        return {"hash": q}
+
+    n = workqueue.run_worker(conn, _cfg(tmp_path, 1), process, logging.getLogger("t"), "w1", lease_s=0.3)
+    assert stolen == [] and n == 1
+    assert workqueue.counts(conn) == {"done": 2}
+    job = workqueue.Job(1, 0, "h0", "")
+    assert not workqueue.complete(conn, job, "w1", {})  # already done
+
+def test_worker_keeps_claiming_past_a_slow_job_and_dedups(tmp_path):
+    conn = workqueue.connect(str(tmp_path / "q.sqlite"))
+    md5 = "44d88612fea8a8f36de82e1278abb02f"
+    workqueue.enqueue(conn, [("slow", "")] + [(f"h{i}", "") for i in range(12)] + [(md5, "a"), (md5.upper(), "b")])
+    started, calls = {}, []
+
+    def process(q, c):
+        calls.append(q)
+        started[q] = time.monotonic()
+        if q == "slow":
+            time.sleep(0.5)
+        return {"hash": q, "comment": c}
+
+    n = workqueue.run_worker(conn, _cfg(tmp_path, 2), process, logging.getLogger("t"), "w1")
+    assert n == 15 and workqueue.counts(conn) == {"done": 15}
+    assert max(started.values()) < started["slow"] + 0.5  # the rest ran while "slow" did
+    assert calls.count(md5) == 1
+    assert [r["comment"] for r in workqueue.iter_results(conn)][-2:] == ["a", "b"]